@@ -0,0 +1,72 @@
+"""dispatch overhead of `c.call.x.y(...)` and `c.call_raw(...)`, without signing and network
+
+`LegacyDispatcher` reproduces the dispatch before routes were compiled (objects + re.sub + path concat per call)
+
+usage, from the repo root: PYTHONPATH=. python bench/bench_dispatch.py [-n 100000], or python -m bench.bench_dispatch
+"""
+import argparse
+import asyncio
+import re
+import time
+
+from nowem import PCRClient
+
+
+class LegacyDispatcher:
+    class Profile:
+        def __init__(self, r):
+            self.api = r.api + f"/{re.sub(r'(?<!^)(?=[A-Z])', '_', 'Profile').lower()}"
+            self.client = r.client
+            self.params = r.params
+
+        async def get_profile(self, uid: int):
+            self.api += '/get_profile'
+            self.params = {'target_viewer_id': uid}
+            return await self.client.req(self.api, self.params, True)
+
+    def __init__(self, c):
+        self.client = c
+        self.api = ''
+        self.params = {}
+
+    @property
+    def profile(self):
+        return LegacyDispatcher.Profile(self)
+
+
+def make_client() -> PCRClient:
+    c = PCRClient('3.7.0', udid='6b0e2b7d-7a4e-4c8e-9d35-8f5b3f0b1c2d', short_udid='123456789',
+                  viewer_id='1234567890', server_id=1)
+
+    async def req(api, params, no_headers=True):
+        return params
+
+    c.req = req
+    return c
+
+
+async def per_call(coro_fn, n: int) -> float:
+    t = time.perf_counter()
+    for i in range(n):
+        await coro_fn(i)
+    return (time.perf_counter() - t) / n
+
+
+async def run(n: int) -> dict:
+    c = make_client()
+    return {
+        'legacy_us': await per_call(lambda i: LegacyDispatcher(c).profile.get_profile(i), n) * 1e6,
+        'call_us': await per_call(lambda i: c.call.profile.get_profile(i), n) * 1e6,
+        'call_raw_us': await per_call(lambda i: c.call_raw('/profile/get_profile', {'target_viewer_id': i}), n) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=100000)
+    r = asyncio.run(run(parser.parse_args().n))
+    print(', '.join(f'{k}: {v:.2f}' for k, v in r.items()))
+
+
+if __name__ == '__main__':
+    main()
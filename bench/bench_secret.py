@@ -0,0 +1,101 @@
+"""per-request CPU time of PCRSecret.prepare_req
+
+`legacy_prepare_req` is the signing path before the fast path was introduced, kept here as the baseline.
+the roundtrip case also handles a response after each request, as the client does; the server sends viewer_id
+back every time, which must not throw away what prepare_req keeps between requests
+
+usage, from the repo root: PYTHONPATH=. python bench/bench_secret.py [-n 20000], or python -m bench.bench_secret
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+import time
+
+import msgpack
+from Cryptodome.Cipher import AES
+from Cryptodome.Util import Padding
+
+from nowem import PCRSecret
+from nowem.record import ReplayResponse
+from nowem.secret import pack_response
+
+UDID = '6b0e2b7d-7a4e-4c8e-9d35-8f5b3f0b1c2d'
+PARAMS = {'target_viewer_id': 123456789}
+
+
+def legacy_prepare_req(sec: PCRSecret, headers: dict, api: str, params: dict):
+    def udid_iv():
+        return sec.udid.replace('-', '')[:16].encode('utf8')
+
+    key = bytes(random.choices(b'0123456789abcdef', k=32))
+    viewer_key = bytes(random.choices(b'0123456789abcdef', k=32))
+    aes = AES.new(viewer_key, AES.MODE_CBC, udid_iv())
+    enc = aes.encrypt(Padding.pad(sec.viewer_id.encode('utf8'), 16)) + viewer_key
+    params = {**params, 'viewer_id': base64.b64encode(enc).decode()}
+
+    aes = AES.new(key, AES.MODE_CBC, udid_iv())
+    packed = msgpack.packb(params, use_bin_type=False)
+    crypted = aes.encrypt(Padding.pad(packed, 16)) + key
+
+    h = hashlib.sha1((sec.udid + api).encode())
+    h.update(base64.b64encode(packed))
+    h.update(sec.viewer_id.encode())
+    headers = headers.copy()
+    headers['PARAM'] = h.hexdigest()
+    headers['Content-Length'] = str(len(crypted))
+
+    # eager formatting of the debug logs, as the logging calls did
+    f'generated key={key}'
+    f'headers = {headers}'
+    f'params = {params}'
+    f'crypted = {base64.b64encode(crypted).decode()}'
+    return crypted, headers
+
+
+def cpu_time(fn, n: int) -> float:
+    t = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - t) / n
+
+
+def roundtrip_cpu_time(sec: PCRSecret, prepare, n: int) -> float:
+    body = pack_response(sec._udid_iv, {'data_headers': {'result_code': 1, 'viewer_id': int(sec.viewer_id)},
+                                        'data': {}})
+
+    async def loop() -> float:
+        t = time.process_time()
+        for _ in range(n):
+            prepare()
+            await sec.handle_resp(ReplayResponse(body))
+        return (time.process_time() - t) / n
+
+    return asyncio.run(loop())
+
+
+def run(n: int) -> dict:
+    sec = PCRSecret(UDID, '123456789', '1234567890', '3.7.0')
+    legacy = lambda: legacy_prepare_req(sec, sec.headers, '/profile/get_profile', PARAMS)
+    fast = lambda: sec.prepare_req('/profile/get_profile', PARAMS)
+    before = cpu_time(legacy, n)
+    after = cpu_time(fast, n)
+    rt_before = roundtrip_cpu_time(sec, legacy, n)
+    rt_after = roundtrip_cpu_time(sec, fast, n)
+    return {'before_us': before * 1e6, 'after_us': after * 1e6, 'speedup': before / after,
+            'roundtrip_before_us': rt_before * 1e6, 'roundtrip_after_us': rt_after * 1e6,
+            'roundtrip_speedup': rt_before / rt_after}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000)
+    r = run(parser.parse_args().n)
+    print(f"prepare_req: before {r['before_us']:.1f}us, after {r['after_us']:.1f}us, x{r['speedup']:.2f}")
+    print(f"with handle_resp: before {r['roundtrip_before_us']:.1f}us, after {r['roundtrip_after_us']:.1f}us, "
+          f"x{r['roundtrip_speedup']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""benchmark suite of the request pipeline hot paths, results are saved as JSON to compare versions
+
+usage:
+    python bench/run.py [--quick] [--out bench.json] [--compare old.json] [--only secret,codec,...]
+
+suites:
+    secret: PCRSecret.prepare_req (vs the legacy path)
+    codec: PCRSecret.pack / unpack for a 1KB profile and a 4MB load/index sized payload
+    dispatch: c.call.x.y(...) and call_raw dispatch overhead
+    playerprefs: dec_xml / dec_plist_xml on generated files, dec_dir with a cold and a warm cache
+    e2e: requests/second against nowem.mock_server with 1, 10, 100 and 1000 concurrent accounts
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import plistlib
+import sys
+import tempfile
+import time
+import uuid
+from urllib.parse import quote
+
+# run from a checkout: the repo root, not only bench/, has to be importable. the standalone scripts of bench/ do
+# not do this themselves, run them with the root on PYTHONPATH or as modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_dispatch
+import bench_secret
+
+from nowem import AiohttpTransport, PCRClient, PCRSecret, RateLimiter, playerprefs
+from nowem.mock_server import MockServer
+
+
+def per_call(fn, n: int) -> float:
+    """microseconds per call"""
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t) / n * 1e6
+
+
+def bench_secret_suite(quick: bool) -> dict:
+    return bench_secret.run(2000 if quick else 20000)
+
+
+def bench_codec_suite(quick: bool) -> dict:
+    sec = PCRSecret(bench_secret.UDID, '123456789', '1234567890', '3.7.0')
+    key = b'0123456789abcdef0123456789abcdef'
+    payloads = {
+        'profile_1k': {'user_info': {'viewer_id': 1234567890, 'user_name': 'x' * 32, 'comment': 'y' * 900}},
+        'load_index_4m': {'unit_list': [{'id': 100001 + i, 'unit_level': 200, 'skill': 'z' * 400}
+                                        for i in range(10000)]},
+    }
+    res = {}
+    for name, obj in payloads.items():
+        n = 20 if name.endswith('m') else 2000
+        n = max(1, n // 10) if quick else n
+        body = base64.b64encode(sec.pack(obj, key)[1])
+        res[f'{name}_bytes'] = len(body)
+        res[f'{name}_pack_us'] = per_call(lambda: sec.pack(obj, key), n)
+        res[f'{name}_unpack_us'] = per_call(lambda: sec.unpack(body), n)
+    return res
+
+
+def bench_dispatch_suite(quick: bool) -> dict:
+    return asyncio.run(bench_dispatch.run(10000 if quick else 100000))
+
+
+def _enc_key(k: str) -> str:
+    return quote(base64.b64encode(playerprefs._xor_endec(k.encode(), playerprefs._KEY_PLAYERPREFS)).decode())
+
+
+def _enc_val(k: str, v: bytes) -> str:
+    # 7 trailing bytes with a zero 5th from the end, see playerprefs._dec_val
+    b = playerprefs._xor_endec(v, k.encode() + playerprefs._KEY_PLAYERPREFS) + b'\1\1\0\1\1\1\1'
+    return quote(base64.b64encode(b).decode())
+
+
+def _prefs(udid: str, n_extra: int) -> dict:
+    u = bytearray(6 + 4 * 36)
+    for i, ch in enumerate(udid):
+        u[4 * i + 6] = ord(ch) + 10
+    prefs = {'UDID': bytes(u), 'SHORT_UDID': b'123456789', 'VIEWER_ID': (1234567890).to_bytes(4, 'little'),
+             'TW_SERVER_ID': (1).to_bytes(4, 'little')}
+    for i in range(n_extra):
+        prefs[f'EXTRA_{i}'] = os.urandom(64)
+    return {_enc_key(k): _enc_val(k, v) for k, v in prefs.items()}
+
+
+def bench_playerprefs_suite(quick: bool) -> dict:
+    n = 20 if quick else 200
+    prefs = _prefs(str(uuid.uuid4()), 200)
+    with tempfile.TemporaryDirectory() as d:
+        xml = os.path.join(d, 'prefs.xml')
+        with open(xml, 'w') as f:
+            f.write("<?xml version='1.0' encoding='utf-8' standalone='yes' ?>\n<map>\n")
+            for k, v in prefs.items():
+                f.write(f'    <string name="{k}">{v}</string>\n')
+            f.write('</map>\n')
+        plist = os.path.join(d, 'prefs.plist')
+        with open(plist, 'wb') as f:
+            plistlib.dump(prefs, f)
+        res = {
+            'dec_xml_us': per_call(lambda: playerprefs.dec_xml(xml), n),
+            'dec_plist_xml_us': per_call(lambda: playerprefs.dec_plist_xml(plist), n),
+        }
+
+        files = os.path.join(d, 'dir')
+        os.mkdir(files)
+        for i in range(n):
+            with open(xml) as src, open(os.path.join(files, f'{i}.xml'), 'w') as dst:
+                dst.write(src.read())
+        cache = os.path.join(d, 'cache')
+        res['dec_dir_cold_ms'] = per_call(lambda: playerprefs.dec_dir(files, cache), 1) / 1000
+        res['dec_dir_warm_ms'] = per_call(lambda: playerprefs.dec_dir(files, cache), 1) / 1000
+        return res
+
+
+async def _e2e(accounts: int, requests: int) -> float:
+    creds = [(str(uuid.uuid4()), str(1000000000 + i)) for i in range(accounts)]
+    transport = AiohttpTransport(limit_per_host=256)
+    async with MockServer(creds) as srv:
+        clients = [PCRClient('3.7.0', udid=u, short_udid='123456789', viewer_id=v, server_id=1, api_root=srv.url,
+                             transport=transport, limiter=RateLimiter(account=None)) for u, v in creds]
+
+        async def run(c: PCRClient):
+            for i in range(requests):
+                await c.call_raw('/profile/get_profile', {'target_viewer_id': i})
+
+        await run(clients[0])  # warm the connection pool up
+        t = time.perf_counter()
+        await asyncio.gather(*[run(c) for c in clients])
+        elapsed = time.perf_counter() - t
+    await transport.close()
+    return accounts * requests / elapsed
+
+
+def bench_e2e_suite(quick: bool) -> dict:
+    res = {}
+    for accounts in (1, 10, 100, 1000):
+        requests = max(1, (200 if quick else 2000) // accounts)
+        res[f'accounts_{accounts}_rps'] = asyncio.run(_e2e(accounts, requests))
+    return res
+
+
+SUITES = {
+    'secret': bench_secret_suite,
+    'codec': bench_codec_suite,
+    'dispatch': bench_dispatch_suite,
+    'playerprefs': bench_playerprefs_suite,
+    'e2e': bench_e2e_suite,
+}
+
+
+def compare(new: dict, old: dict):
+    for suite, values in new['results'].items():
+        for k, v in values.items():
+            o = old.get('results', {}).get(suite, {}).get(k)
+            if o:
+                print(f'{suite}.{k}: {o:.2f} -> {v:.2f} ({v / o:.2f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quick', action='store_true', help='fewer iterations, for a smoke run')
+    parser.add_argument('--only', default='', help='comma separated suites')
+    parser.add_argument('--out', default='bench.json')
+    parser.add_argument('--compare', default='', help='a previous result file')
+    args = parser.parse_args()
+
+    names = [s for s in args.only.split(',') if s] or list(SUITES)
+    report = {
+        'time': time.time(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': {},
+    }
+    for name in names:
+        print(f'running {name}...', flush=True)
+        report['results'][name] = r = SUITES[name](args.quick)
+        for k, v in r.items():
+            print(f'  {k}: {v:.2f}')
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'saved to {args.out}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,15 +18,14 @@ def read_raw(raw: str):
 
 
 async def main():
-    c = PCRClient('3.7.0', pp_xml=playerprefs.dec_plist_xml('../data/tw.sonet.princessconnect.plist'))
-
-    while True:
-        raw = input('input(hex/b64)>>>')
-        dec, key = c.sec.unpack(read_raw(raw))
-        print(f'data: {json.dumps(dec)}')
-        print(f'key: {key}')
-        if 'viewer_id' in dec:
-            print(f'viewer_id: {c.sec.decrypt(dec["viewer_id"].encode())}')
+    async with PCRClient('3.7.0', pp_xml=playerprefs.dec_plist_xml('../data/tw.sonet.princessconnect.plist')) as c:
+        while True:
+            raw = input('input(hex/b64)>>>')
+            dec, key = c.sec.unpack(read_raw(raw))
+            print(f'data: {json.dumps(dec)}')
+            print(f'key: {key}')
+            if 'viewer_id' in dec:
+                print(f'viewer_id: {c.sec.decrypt(dec["viewer_id"].encode())}')
 
 
 asyncio.run(main())
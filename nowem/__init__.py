@@ -1,3 +1,13 @@
+from .cache import ResponseCache
 from .client import PCRClient
-from .exception import PCRAPIException
+from .codec import CodecExecutor
+from .exception import PCRAPIException, PCRHTTPException
+from .pool import ClientPool
+from .ratelimit import RateLimiter
+from .registry import AccountRegistry
+from .retry import RetryPolicy
+from .scanner import ProfileScanner
 from .secret import PCRSecret
+from .singleflight import SingleFlight
+from .trace import Tracer, MemoryTracer
+from .transport import Transport, AiohttpTransport, ExecutorTransport
@@ -3,7 +3,7 @@
 
 import asyncio
 from functools import partial
-from typing import Optional, Any
+from typing import Optional, Any, AsyncIterator
 
 import requests
 
@@ -54,6 +54,10 @@ class AsyncResponse:
     async def text(self) -> str:
         return await run_sync_func(lambda: self.raw_response.text)
 
+    async def iter_chunks(self, size: int = 65536) -> AsyncIterator[bytes]:
+        # requests has already read the whole body
+        yield await self.content
+
     async def json(self, **kwargs) -> Any:
         return await run_sync_func(self.raw_response.json, **kwargs)
 
@@ -0,0 +1,53 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, List, Set
+
+from .client import PCRClient
+
+
+async def iter_battle_logs(c: PCRClient,
+                           clan_battle_id: int,
+                           phases: List[int],
+                           report_types: List[int] = (1, 2, 3, 4),
+                           order_num: int = 0,
+                           hide_same_units: int = 0,
+                           favorite_ids: List[int] = (),
+                           sort_type: int = 1,
+                           start_page: int = 1,
+                           list_key: str = 'battle_list',
+                           id_key: str = 'battle_log_id') -> AsyncIterator[dict]:
+    """walk every page of clan_battle/battle_log_list and yield the log entries
+
+    page N+1 is requested while the caller handles page N, so at most two pages are in memory.
+    entries seen on the previous two pages (the list moves while new battles are reported) are skipped by `id_key`.
+    stops at the first page that is empty or only has entries already seen, as when the last page is sent again
+    """
+
+    def fetch(page: int) -> asyncio.Future:
+        return asyncio.ensure_future(c.call.clan_battle.battle_log_list(clan_battle_id, order_num, list(phases),
+                                                                        list(report_types), hide_same_units,
+                                                                        list(favorite_ids), sort_type, page))
+
+    # ids of the latest pages only, memory does not grow with the log
+    recent: Deque[Set] = deque(maxlen=2)
+    page = start_page
+    nxt = fetch(page)
+    try:
+        while True:
+            new, ids = [], set()
+            for e in (await nxt).get(list_key) or []:
+                i = e.get(id_key)
+                if i is not None:
+                    if i in ids or any(i in r for r in recent):
+                        continue
+                    ids.add(i)
+                new.append(e)
+            if not new:
+                return
+            recent.append(ids)
+            page += 1
+            nxt = fetch(page)
+            for e in new:
+                yield e
+    finally:
+        nxt.cancel()
@@ -0,0 +1,64 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# api path -> seconds a response stays fresh
+DEFAULT_TTLS = {
+    '/profile/get_profile': 60,
+    '/clan/info': 30,
+    '/clan_battle/top': 10,
+    '/payment/item_list': 300,
+}
+
+
+def params_key(params: dict) -> str:
+    """a hashable form of params, equal for equal params whatever the key order"""
+    return json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+
+
+class ResponseCache:
+    """TTL + LRU cache of whole responses (`data_headers` and `data`) for idempotent apis
+
+    only apis listed in `ttls` are cached, entries are keyed by (viewer_id, api, params).
+    cached responses are shared by every caller, do not modify them
+    """
+
+    def __init__(self, ttls: Dict[str, float] = None, maxsize: int = 1024):
+        self.ttls = DEFAULT_TTLS.copy() if ttls is None else ttls
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[tuple, Tuple[float, dict]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    @staticmethod
+    def key(viewer_id: str, api: str, params: dict) -> tuple:
+        return viewer_id, api, params_key(params)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        e = self._data.get(key)
+        if e is None or e[0] < time.monotonic():
+            if e is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return e[1]
+
+    def put(self, key: tuple, response: dict):
+        self._data[key] = (time.monotonic() + self.ttls[key[1]], response)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, api: str = None, viewer_id: str = None):
+        """drop entries matching api and/or viewer_id, everything when both are None"""
+        for k in [k for k in self._data if (api is None or k[1] == api) and (viewer_id is None or k[0] == viewer_id)]:
+            del self._data[k]
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
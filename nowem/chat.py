@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Tuple
+
+from .client import PCRClient
+
+log = logging.getLogger(__name__)
+
+
+class ClanChatPoller:
+    """follow a clan chat incrementally
+
+    every poll only asks for messages after the last one seen and lets the server hold the request up to
+    `wait_interval` seconds, so an idle clan costs an almost empty response per poll.
+    yields (kind, item) events:
+        'chat': a new clan_chat_message
+        'equip_request': a new equip request, or one whose donation_num changed
+        'user_equip': an entry of user_equip_data whose equip_count changed
+    """
+
+    def __init__(self, c: PCRClient, clan_id: int, count: int = 10, wait_interval: int = 3, interval: float = 0,
+                 start_message_id: int = 0):
+        self.client = c
+        self.clan_id = clan_id
+        self.count = count
+        self.wait_interval = wait_interval
+        self.interval = interval
+        self.last_message_id = start_message_id
+
+        # message_id -> donation_num of the equip requests still open
+        self.equip_requests: Dict[int, int] = {}
+        # equip_id -> equip_count
+        self.user_equip: Dict[int, int] = {}
+
+    async def poll(self) -> list:
+        """poll once, return the events"""
+        res = await self.client.call.clan.chat_info_list(self.clan_id, self.count, self.wait_interval,
+                                                         start_message_id=self.last_message_id,
+                                                         update_message_ids=list(self.equip_requests))
+        events = []
+
+        # the page is not always in ascending order, compare against the id from before this poll
+        prev = self.last_message_id
+        new = sorted((m for m in res.get('clan_chat_message') or [] if m['message_id'] > prev),
+                     key=lambda m: m['message_id'])
+        events.extend(('chat', m) for m in new)
+        if new:
+            self.last_message_id = new[-1]['message_id']
+
+        for r in res.get('equip_requests') or []:
+            if self.equip_requests.get(r['message_id']) != r['donation_num']:
+                self.equip_requests[r['message_id']] = r['donation_num']
+                events.append(('equip_request', r))
+
+        for u in res.get('user_equip_data') or []:
+            if self.user_equip.get(u['equip_id']) != u['equip_count']:
+                self.user_equip[u['equip_id']] = u['equip_count']
+                events.append(('user_equip', u))
+
+        # keep following only the requests the server still reports
+        if 'equip_requests' in res:
+            alive = {r['message_id'] for r in res['equip_requests']}
+            for i in [i for i in self.equip_requests if i not in alive]:
+                del self.equip_requests[i]
+
+        return events
+
+    async def __aiter__(self) -> AsyncIterator[Tuple[str, dict]]:
+        while True:
+            for e in await self.poll():
+                yield e
+            if self.interval:
+                await asyncio.sleep(self.interval)
@@ -1,14 +1,26 @@
-import functools
+import asyncio
 import logging
 import random
 import string
 import time
 import uuid
+from typing import Optional
 
-from .aiorequests import post, get
+from . import donation
+from . import session
+from .cache import ResponseCache
+from .codec import CodecExecutor
+from .exception import PCRAPIException, PCRHTTPException
 from .playerprefs import dec_xml
-from .req import ReqDispatcher
+from .ratelimit import RateLimiter, is_congestion
+from .record import Recorder
+from .req import ReqDispatcher, STATE_APIS
+from .retry import RetryPolicy
 from .secret import PCRSecret
+from .singleflight import SingleFlight
+from .state import GameState
+from .trace import Span, Tracer
+from .transport import Transport, AiohttpTransport, ExecutorTransport
 
 _API_ROOT = ['https://api-pc.so-net.tw',
              'https://api2-pc.so-net.tw',
@@ -29,7 +41,18 @@ class PCRClient:
                  short_udid: str = '',
                  viewer_id: str = '',
                  server_id: int = 0,
-                 proxy: dict = None):
+                 api_root: str = '',
+                 proxy: dict = None,
+                 transport: Transport = None,
+                 use_executor: bool = False,
+                 codec: CodecExecutor = None,
+                 limiter: RateLimiter = None,
+                 cache: ResponseCache = None,
+                 flights: SingleFlight = None,
+                 tracer: Tracer = None,
+                 recorder: Recorder = None,
+                 retry: RetryPolicy = None,
+                 timeout: float = 5):
         # check arguments
         if playerprefs:
             pp_xml = dec_xml(playerprefs)
@@ -55,11 +78,44 @@ class PCRClient:
         self.server_id = server_id
         self.proxy = proxy or {}
 
-        # init when login()
-        self.game_data = None
+        # init when login(), then kept up to date by the responses
+        self.game_data: Optional[GameState] = None
         self.token = ''.join(random.choices(string.digits, k=16))
 
-        self.api_root = _API_ROOT[server_id - 1]
+        # api_root overrides the server, e.g. to talk to nowem.mock_server
+        self.api_root = api_root or _API_ROOT[server_id - 1]
+
+        # a transport passed in is shared and owned by the caller, otherwise the client owns its own one
+        self._own_transport = transport is None
+        self.transport = transport or (ExecutorTransport() if use_executor else AiohttpTransport())
+        # optional, decodes large responses off the event loop
+        self.codec = codec
+        # spaces requests before they are sent, share one among clients to limit per host
+        self.limiter = limiter or RateLimiter()
+        # optional, serves idempotent apis from memory
+        self.cache = cache
+        # optional, coalesces identical concurrent reads, share one among clients to coalesce across them
+        self.flights = flights
+        # optional, gets per-phase timings of every request sent
+        self.tracer = tracer
+        # optional, appends every request and decoded response to a log, see nowem.record
+        self.recorder = recorder
+        # optional, retries transient failures and hedges slow reads
+        self.retry = retry
+        # seconds for one attempt, from sent to the whole body read
+        self.timeout = timeout
+
+        self._call = ReqDispatcher(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._own_transport:
+            await self.transport.close()
 
     async def register(self, udid=str(uuid.uuid1()), version: str = ''):
         log.warning(f'registering now, udid={udid}')
@@ -74,8 +130,8 @@ class PCRClient:
               'Accept-Language': 'zh-CN,en-US;q=0.9',
               'X-Requested-With': 'tw.sonet.princessconnect'}
 
-        await get(self.api_root + '/agreement/first_view/1002/2001', headers=gh,
-                  proxies=self.proxy)
+        await (await self.transport.get(self.api_root + '/agreement/first_view/1002/2001', headers=gh,
+                                        proxies=self.proxy)).content
 
         r = (await self.call.tool.signup(no_headers=False).exec())['data_headers']
 
@@ -84,21 +140,164 @@ class PCRClient:
 
     async def req(self, api: str, params: dict, no_headers=True):
         log.debug(f'exec request: api = {api}')
-        data, headers = self.sec.prepare_req(api, params)
+        res = None
+        cacheable = self.cache is not None and api in self.cache.ttls
+        if cacheable:
+            key = self.cache.key(self.sec.viewer_id, api, params)
+            res = self.cache.get(key)
+        if res is None:
+            if self.flights is not None and api in self.flights.apis:
+                res = await self.flights.do(self.flights.key(self.sec.viewer_id, api, params),
+                                            lambda: self._send(api, params))
+            else:
+                res = await self._send(api, params)
+            if cacheable:
+                self.cache.put(key, res)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f'request success: api = {api}')
+            log.debug(f'request result = {res}')
+        return res['data'] if no_headers else res
+
+    async def _send(self, api: str, params: dict) -> dict:
+        if self.retry is None:
+            return await self._attempt(api, params)
+        attempt = 0
+        while True:
+            try:
+                delay = self.retry.hedge_delay(api)
+                if delay is None:
+                    return await self._attempt(api, params)
+                return await self._hedge(api, params, delay)
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.retry.attempts or not self.retry.retryable(api, e):
+                    raise
+                wait = self.retry.backoff(attempt - 1)
+                self.retry.retries += 1
+                log.warning(f'{api} failed, retry {attempt} in {wait:.2f}s: {e!r}')
+                await asyncio.sleep(wait)
+
+    async def _hedge(self, api: str, params: dict, delay: float) -> dict:
+        """send again if no answer after `delay`, return the first success
+
+        the limiter is waited for once here, so that queueing does not count as latency; the copy shares the token
+        """
+        waited = await self.limiter.acquire(self, api)
+        pending = {asyncio.ensure_future(self._attempt(api, params, waited))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return done.pop().result()
+            self.retry.hedges += 1
+            pending.add(asyncio.ensure_future(self._attempt(api, params, 0.)))
+            error, won = None, None
+            while pending and won is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for f in done:
+                    if f.exception() is None:
+                        won = f
+                    else:
+                        error = error or f.exception()
+            if won is None:
+                raise error
+            return won.result()
+        finally:
+            for f in pending:
+                f.cancel()
 
-        resp = await post(self.api_root + api, data=data, headers=headers, timeout=5, proxies=self.proxy)
-        res = await self.sec.handle_resp(resp, no_headers)
-        log.debug(f'request success: api = {api}')
-        log.debug(f'request result = {res}')
+    async def _attempt(self, api: str, params: dict, waited: Optional[float] = None) -> dict:
+        """`waited`: seconds the caller already spent in the limiter, None to acquire it here"""
+        if self.tracer is None:
+            return await self._exchange(api, params, None, waited)
+        span = self.tracer.start(api)
+        try:
+            return await self._exchange(api, params, span, waited)
+        except BaseException as e:
+            span.error = e
+            raise
+        finally:
+            self.tracer.finish(span)
+
+    async def _exchange(self, api: str, params: dict, span: Optional[Span], waited: Optional[float] = None) -> dict:
+        data, headers = self.sec.prepare_req(api, params, span)
+
+        if waited is not None:
+            if span is not None:
+                span.add('queue', waited)
+        elif span is None:
+            await self.limiter.acquire(self, api)
+        else:
+            t = time.perf_counter()
+            await self.limiter.acquire(self, api)
+            span.add('queue', time.perf_counter() - t)
+        try:
+            t = time.perf_counter()
+            resp = await self.transport.post(self.api_root + api, data=data, headers=headers, timeout=self.timeout,
+                                             proxies=self.proxy, span=span)
+            if span is not None:
+                span.add('ttfb', time.perf_counter() - t - span.phases.get('connect', 0.))
+            if resp.status_code >= 400:
+                await resp.content
+                raise PCRHTTPException(f'HTTP {resp.status_code} on {api}', resp.status_code)
+            res = await self.sec.handle_resp(resp, False, self.codec, span)
+        except PCRAPIException as e:
+            # the server did answer, game logic errors do not back off
+            self.limiter.on_success(self)
+            if self.recorder is not None:
+                self.recorder.record_error(api, params, e, time.perf_counter() - t)
+            raise
+        except Exception as e:
+            if is_congestion(e):
+                self.limiter.on_error(self)
+            else:
+                self.limiter.on_success(self)
+            raise
+        self.limiter.on_success(self)
+        dt = time.perf_counter() - t
+        if self.retry is not None:
+            self.retry.observe(api, dt)
+        if self.recorder is not None:
+            self.recorder.record(api, params, res, dt)
+
+        if self.game_data is not None and api.startswith(STATE_APIS):
+            self.game_data.apply(res['data'])
         return res
 
-    async def login(self):
-        await self.call.check.check_agreement(latency=0.5)
-        await self.call.check.game_start(latency=0.5)
-        self.game_data = await self.call.load.index()
+    async def login(self, snapshot: str = '', max_age: float = 86400):
+        """login, with `snapshot` the session saved in this file is tried first and saved after a full login"""
+        if snapshot and await self.try_restore(session.load(snapshot, max_age)):
+            return
+
+        await self.call.check.check_agreement()
+        await self.call.check.game_start()
+        self.game_data = GameState(await self.call.load.index())
         self.token = ''.join(random.choices(string.digits, k=16))
 
-    async def pass_tutorial(self, latency=0.5):
+        if snapshot:
+            session.save(self, snapshot)
+
+    async def try_restore(self, snap: Optional[dict]) -> bool:
+        """restore a snapshot of this account and check the server still accepts it, False when a login is needed"""
+        if snap is None or snap['viewer_id'] != self.sec.viewer_id:
+            return False
+        self.restore(snap)
+        try:
+            # straight to the server, a cached or shared answer would not tell anything about this session
+            await self._send('/payment/item_list', {})
+        except PCRAPIException as e:
+            log.info(f'session rejected, login again: {e.message}')
+            return False
+        log.info(f'session restored: viewer_id = {self.sec.viewer_id}')
+        return True
+
+    def snapshot(self) -> dict:
+        return session.snapshot(self)
+
+    def restore(self, snap: dict):
+        session.restore(self, snap)
+
+    async def pass_tutorial(self, latency=None):
         # tutorial
         steps = [1, 2, 3, 4, 5, 6, 7, 20, 30, 40, 50, 60, 100]
         for i in steps:
@@ -106,20 +305,12 @@ class PCRClient:
             log.info(f'tutorial step: {i}')
 
     async def donate_equipment(self):
-        clan_id = (await self.call.clan.info())['clan']['detail']['clan_id']
-        chats = await self.call.clan.chat_info_list(clan_id)
-
-        equip_reqs = filter(lambda x: x['user_donation_num'] == 0 and x['donation_num'] <= 8, chats['equip_requests'])
-        chat_reqs = filter(lambda x: x['message_type'] == 2 and x['create_time'] > int(time.time()) - 28800,
-                           chats['clan_chat_message'])
+        return await donation.donate(self)
 
-        for c in chat_reqs:
-            e = functools.reduce(lambda x, y: y if y['message_id'] == c['message_id'] else x, equip_reqs, {})
-            if not e:
-                continue
-            u = functools.reduce(lambda x, y: y if y['equip_id'] == e['equip_id'] else x, chats['user_equip_data'])
-            await self.call.equipment.donate(clan_id, c['message_id'], 2, u['equip_count'])
+    async def call_raw(self, api: str, params: dict = None, no_headers=True):
+        """call an api by path, skips the route objects, e.g. call_raw('/profile/get_profile', {...})"""
+        return await self.req(api, params or {}, no_headers)
 
     @property
-    def call(self):
-        return ReqDispatcher(self)
+    def call(self) -> ReqDispatcher:
+        return self._call
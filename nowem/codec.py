@@ -0,0 +1,43 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Tuple
+
+from .secret import unpack_buffer
+
+
+def _unpack_in_worker(iv: bytes, data: bytes) -> Tuple[dict, bytes]:
+    return unpack_buffer(iv, bytearray(data))
+
+
+class CodecExecutor:
+    """run response decoding (AES + msgpack) off the event loop
+
+    payloads smaller than `threshold` bytes are still decoded inline, an executor hop costs more than them.
+    mode:
+        'process': a process pool, sidesteps the GIL; payloads are copied into the worker and the result back
+        'thread': a thread pool, no copies, only keeps the loop responsive as AES releases the GIL but msgpack not
+
+    request bodies are tiny (a few KB at most), so encoding always stays inline.
+    one CodecExecutor can be shared by many clients, shut it down when they are done.
+    """
+
+    def __init__(self, mode: str = 'process', max_workers: int = None, threshold: int = 256 * 1024):
+        if mode not in ('process', 'thread'):
+            raise ValueError(f'unknown codec mode: {mode}, accept: process, thread')
+        self.mode = mode
+        self.threshold = threshold
+        max_workers = max_workers or os.cpu_count() or 1
+        self.executor: Executor = ProcessPoolExecutor(max_workers) if mode == 'process' \
+            else ThreadPoolExecutor(max_workers, thread_name_prefix='nowem-codec')
+
+    async def unpack(self, iv: bytes, buf: memoryview) -> Tuple[dict, bytes]:
+        if len(buf) < self.threshold:
+            return unpack_buffer(iv, buf)
+        loop = asyncio.get_running_loop()
+        if self.mode == 'process':
+            return await loop.run_in_executor(self.executor, _unpack_in_worker, iv, bytes(buf))
+        return await loop.run_in_executor(self.executor, unpack_buffer, iv, buf)
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait)
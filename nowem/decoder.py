@@ -0,0 +1,232 @@
+"""decode captured traffic in bulk
+
+usage: python -m nowem.decoder --udid <udid> [--udid ...] [-j 8] [-o out.jsonl] <capture> [<capture> ...]
+
+a capture is a HAR file (.har), a Fiddler session archive (.saz) or a directory of raw bodies (one per file).
+captures are streamed, packets are decoded in a process pool and written as JSON lines in input order:
+    {"source": ..., "kind": "request" | "response", "api": ..., "data": ..., "viewer_id": ...}
+or {"source": ..., "kind": ..., "error": ...} when no given udid decodes it
+"""
+import argparse
+import base64
+import binascii
+import gzip
+import json
+import os
+import sys
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, TextIO, Tuple
+from urllib.parse import urlsplit
+
+from .secret import BodyDecoder, decrypt_buffer, unpack_buffer
+
+# (source, kind, api, body), a request body is raw AES, a response body is base64 text
+Packet = Tuple[str, str, str, bytes]
+
+_ivs: List[bytes] = []
+
+
+def _init_worker(ivs: List[bytes]):
+    global _ivs
+    _ivs = ivs
+
+
+def _to_json(o):
+    return o.hex() if isinstance(o, (bytes, bytearray)) else str(o)
+
+
+def decode_packet(p: Packet, ivs: List[bytes] = None) -> dict:
+    source, kind, api, body = p
+    res = {'source': source, 'kind': kind, 'api': api}
+    if kind == 'response':
+        d = BodyDecoder(len(body))
+        try:
+            d.feed(body)
+            raw = bytes(d.finish())
+        except (ValueError, binascii.Error) as e:
+            return {**res, 'error': f'bad base64: {e}'}
+    else:
+        raw = body
+
+    for iv in ivs if ivs is not None else _ivs:
+        try:
+            data, _ = unpack_buffer(iv, bytearray(raw))
+        except Exception:
+            continue
+        res['data'] = data
+        v = data.get('viewer_id') if kind == 'request' and isinstance(data, dict) else None
+        if isinstance(v, str):
+            try:
+                b = bytearray(base64.b64decode(v))
+                res['viewer_id'] = bytes(decrypt_buffer(iv, b)[0]).decode()
+            except Exception:
+                pass
+        return res
+    return {**res, 'error': 'cannot be decoded with the given udid'}
+
+
+def _har_body(o: dict) -> Optional[bytes]:
+    if not o or 'text' not in o:
+        return None
+    text = o['text']
+    return base64.b64decode(text) if o.get('encoding') == 'base64' else text.encode('latin-1', 'replace')
+
+
+def _iter_json_array(f: TextIO, key: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """yield the items of the first array named `key` without loading the whole document"""
+    dec = json.JSONDecoder()
+    buf = ''
+    eof = False
+
+    def more() -> bool:
+        nonlocal buf, eof
+        c = f.read(chunk_size)
+        eof = not c
+        buf += c
+        return not eof
+
+    needle = f'"{key}"'
+    while needle not in buf:
+        buf = buf[-len(needle):]
+        if not more():
+            return
+    buf = buf[buf.index(needle) + len(needle):]
+    while '[' not in buf:
+        if not more():
+            return
+    buf = buf[buf.index('[') + 1:]
+
+    while True:
+        buf = buf.lstrip(' \t\r\n,')
+        if not buf and not more():
+            return
+        if not buf:
+            continue
+        if buf[0] == ']':
+            return
+        try:
+            item, end = dec.raw_decode(buf)
+        except json.JSONDecodeError:
+            if not more():
+                raise
+            continue
+        buf = buf[end:]
+        yield item
+
+
+def iter_har(path: str) -> Iterator[Packet]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for i, e in enumerate(_iter_json_array(f, 'entries')):
+            api = urlsplit(e['request']['url']).path
+            req = _har_body(e['request'].get('postData'))
+            if req:
+                yield f'{path}#{i}', 'request', api, req
+            resp = _har_body(e.get('response', {}).get('content'))
+            if resp:
+                yield f'{path}#{i}', 'response', api, resp
+
+
+def _http_body(raw: bytes) -> Tuple[str, bytes]:
+    """split a raw HTTP message saved by Fiddler, return (first line, decoded body)"""
+    head, _, body = raw.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(':') for l in lines[1:])}
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        out, rest = bytearray(), body
+        while rest:
+            size, _, rest = rest.partition(b'\r\n')
+            n = int(size.split(b';')[0] or b'0', 16)
+            if not n:
+                break
+            out += rest[:n]
+            rest = rest[n + 2:]
+        body = bytes(out)
+    if headers.get('content-encoding', '').lower() == 'gzip':
+        body = gzip.decompress(body)
+    return lines[0], body
+
+
+def iter_saz(path: str) -> Iterator[Packet]:
+    with zipfile.ZipFile(path) as z:
+        names = sorted(n for n in z.namelist() if n.startswith('raw/') and n.endswith('_c.txt'))
+        for n in names:
+            line, req = _http_body(z.read(n))
+            parts = line.split(' ')
+            api = urlsplit(parts[1]).path if len(parts) > 1 else ''
+            if req:
+                yield f'{path}#{n}', 'request', api, req
+            s = n[:-len('_c.txt')] + '_s.txt'
+            if s in z.namelist():
+                _, resp = _http_body(z.read(s))
+                if resp:
+                    yield f'{path}#{s}', 'response', api, resp
+
+
+def iter_dir(path: str) -> Iterator[Packet]:
+    """raw bodies, told apart like example/pkg_decoder.py: responses are base64 text, requests are binary or hex"""
+    for name in sorted(os.listdir(path)):
+        p = os.path.join(path, name)
+        if not os.path.isfile(p):
+            continue
+        with open(p, 'rb') as f:
+            body = f.read()
+        # hex digits are base64 too, so hex is tried first: a hex dump is a request
+        try:
+            yield p, 'request', '', bytes.fromhex(body.decode('ascii'))
+            continue
+        except ValueError:
+            pass
+        try:
+            base64.b64decode(body.strip(), validate=True)
+            yield p, 'response', '', body.strip()
+        except (ValueError, binascii.Error):
+            yield p, 'request', '', body
+
+
+def iter_capture(path: str) -> Iterator[Packet]:
+    if os.path.isdir(path):
+        return iter_dir(path)
+    if path.endswith('.saz'):
+        return iter_saz(path)
+    return iter_har(path)
+
+
+def decode_all(paths: List[str], udids: List[str], out: TextIO, workers: int = None):
+    ivs = [u.replace('-', '')[:16].encode('utf8') for u in udids]
+    workers = workers or os.cpu_count() or 1
+    window = deque()
+
+    def write(r: dict):
+        out.write(json.dumps(r, ensure_ascii=False, default=_to_json))
+        out.write('\n')
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(ivs,)) as ex:
+        for path in paths:
+            for p in iter_capture(path):
+                window.append(ex.submit(decode_packet, p))
+                if len(window) >= workers * 8:
+                    write(window.popleft().result())
+        while window:
+            write(window.popleft().result())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='decode captured PCR traffic into JSON lines')
+    parser.add_argument('captures', nargs='+', help='.har, .saz or a directory of raw bodies')
+    parser.add_argument('--udid', action='append', required=True, help='udid of the captured account, repeatable')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='worker processes, default: cpu count')
+    parser.add_argument('-o', '--output', default='-', help='output file, default: stdout')
+    args = parser.parse_args()
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        decode_all(args.captures, args.udid, out, args.jobs)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
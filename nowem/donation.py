@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from . import client
+
+log = logging.getLogger(__name__)
+
+# equipments given per donation
+_DONATION_NUM = 2
+
+
+def plan_donations(chats: dict, now: int = None, max_age: int = 28800) -> List[Tuple[int, int]]:
+    """plan the donations for a clan/chat_info_list result in one pass
+
+    returns (message_id, current_equip_num) for every open request younger than max_age that this account has not
+    donated to yet and has enough equipments for. the stock is decreased as planned, so several requests of the same
+    equipment get the right current_equip_num
+    """
+    now = int(time.time()) if now is None else now
+    reqs = {e['message_id']: e for e in chats.get('equip_requests') or []
+            if e['user_donation_num'] == 0 and e['donation_num'] <= 8}
+    stock = {u['equip_id']: u['equip_count'] for u in chats.get('user_equip_data') or []}
+
+    plan = []
+    for m in chats.get('clan_chat_message') or []:
+        if m['message_type'] != 2 or m['create_time'] <= now - max_age:
+            continue
+        e = reqs.get(m['message_id'])
+        if e is None:
+            continue
+        n = stock.get(e['equip_id'], 0)
+        if n < _DONATION_NUM:
+            continue
+        plan.append((m['message_id'], n))
+        stock[e['equip_id']] = n - _DONATION_NUM
+    return plan
+
+
+async def donate(c: 'client.PCRClient', clan_id: int = 0) -> int:
+    """donate to every open request of the clan, return how many donations were made"""
+    clan_id = clan_id or (await c.call.clan.info())['clan']['detail']['clan_id']
+    chats = await c.call.clan.chat_info_list(clan_id)
+    plan = plan_donations(chats)
+    for message_id, current in plan:
+        await c.call.equipment.donate(clan_id, message_id, _DONATION_NUM, current)
+    return len(plan)
+
+
+async def donate_clan(clients: Iterable['client.PCRClient'], clan_id: int = 0,
+                      concurrency: int = 8) -> Dict[str, int]:
+    """run a donation round on many accounts at once, return viewer_id -> donations (-1 if it failed)"""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(c):
+        async with sem:
+            try:
+                return c.sec.viewer_id, await donate(c, clan_id)
+            except Exception as e:
+                log.warning(f'donation failed on viewer_id={c.sec.viewer_id}: {e!r}')
+                return c.sec.viewer_id, -1
+
+    return dict(await asyncio.gather(*[one(c) for c in clients]))
@@ -4,3 +4,10 @@ class PCRAPIException(Exception):
         self.message = message
         self.status = status
         self.result_code = result_code
+
+
+class PCRHTTPException(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
@@ -0,0 +1,152 @@
+"""Prometheus metrics of PCRClient fleets
+
+    metrics = Metrics()
+    c = PCRClient(..., tracer=metrics)        # or MultiTracer([metrics, MemoryTracer()])
+    await metrics.serve(port=9100)            # GET /metrics
+    metrics.dump('metrics.prom')              # or for node_exporter's textfile collector
+"""
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from aiohttp import web
+
+from .exception import PCRAPIException
+from .trace import Span, Tracer
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _escape(v) -> str:
+    return str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(**kwargs) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in kwargs.items()) + '}'
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, n: int):
+        self.counts = [0] * n
+        self.sum = 0.
+        self.count = 0
+
+
+class Metrics(Tracer):
+    """collects counters from the spans of the clients it traces, render() gives the Prometheus text format
+
+    nowem_requests_total{api,result}: result is the result_code, or the error type
+    nowem_api_errors_total{api,result_code}: PCRAPIException raised
+    nowem_request_duration_seconds{api}: histogram
+    nowem_bytes_total{api,direction}: body bytes, in is after base64 decoding
+    nowem_in_flight: requests started and not finished, the ones waiting for the rate limiter included
+    nowem_ratelimit_wait_seconds_total{api}, nowem_ratelimit_waits_total{api}: time spent in RateLimiter
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.requests: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.api_errors: Dict[Tuple[str, int], int] = defaultdict(int)
+        self.durations: Dict[str, _Histogram] = {}
+        self.bytes: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.wait_seconds: Dict[str, float] = defaultdict(float)
+        self.waits: Dict[str, int] = defaultdict(int)
+        self.in_flight = 0
+
+    def start(self, api: str) -> Span:
+        self.in_flight += 1
+        return Span(api)
+
+    def finish(self, span: Span):
+        self.in_flight -= 1
+        api = span.api
+
+        if span.error is None:
+            result = str(span.result_code)
+        elif isinstance(span.error, PCRAPIException):
+            result = str(span.error.result_code)
+            self.api_errors[api, span.error.result_code] += 1
+        else:
+            result = type(span.error).__name__
+        self.requests[api, result] += 1
+
+        h = self.durations.get(api)
+        if h is None:
+            h = self.durations[api] = _Histogram(len(self.buckets))
+        total = span.total
+        i = bisect_left(self.buckets, total)
+        if i < len(self.buckets):
+            h.counts[i] += 1
+        h.sum += total
+        h.count += 1
+
+        self.bytes[api, 'out'] += span.request_bytes
+        self.bytes[api, 'in'] += span.response_bytes
+
+        wait = span.phases.get('queue', 0.)
+        if wait > 0:
+            self.wait_seconds[api] += wait
+            self.waits[api] += 1
+
+    def render(self) -> str:
+        lines = []
+
+        def head(name: str, kind: str, doc: str):
+            lines.append(f'# HELP {name} {doc}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        head('nowem_requests_total', 'counter', 'requests sent by api and result')
+        for (api, result), v in sorted(self.requests.items()):
+            lines.append(f'nowem_requests_total{_labels(api=api, result=result)} {v}')
+
+        head('nowem_api_errors_total', 'counter', 'server_error answers by api and result_code')
+        for (api, code), v in sorted(self.api_errors.items(), key=str):
+            lines.append(f'nowem_api_errors_total{_labels(api=api, result_code=code)} {v}')
+
+        head('nowem_request_duration_seconds', 'histogram', 'request latency')
+        for api, h in sorted(self.durations.items()):
+            acc = 0
+            for le, n in zip(self.buckets, h.counts):
+                acc += n
+                lines.append(f'nowem_request_duration_seconds_bucket{_labels(api=api, le=le)} {acc}')
+            lines.append(f'nowem_request_duration_seconds_bucket{_labels(api=api, le="+Inf")} {h.count}')
+            lines.append(f'nowem_request_duration_seconds_sum{_labels(api=api)} {h.sum}')
+            lines.append(f'nowem_request_duration_seconds_count{_labels(api=api)} {h.count}')
+
+        head('nowem_bytes_total', 'counter', 'body bytes by api and direction')
+        for (api, direction), v in sorted(self.bytes.items()):
+            lines.append(f'nowem_bytes_total{_labels(api=api, direction=direction)} {v}')
+
+        head('nowem_in_flight', 'gauge', 'requests waiting for the rate limiter or for an answer')
+        lines.append(f'nowem_in_flight {self.in_flight}')
+
+        head('nowem_ratelimit_wait_seconds_total', 'counter', 'time spent waiting for the rate limiter')
+        for api, v in sorted(self.wait_seconds.items()):
+            lines.append(f'nowem_ratelimit_wait_seconds_total{_labels(api=api)} {v}')
+        head('nowem_ratelimit_waits_total', 'counter', 'requests delayed by the rate limiter')
+        for api, v in sorted(self.waits.items()):
+            lines.append(f'nowem_ratelimit_waits_total{_labels(api=api)} {v}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    async def serve(self, host: str = '0.0.0.0', port: int = 9100) -> web.AppRunner:
+        """serve GET /metrics, call cleanup() of the returned runner to stop"""
+
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
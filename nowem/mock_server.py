@@ -0,0 +1,164 @@
+"""a local stand-in for the game server, speaking the same protocol as PCRSecret
+
+usage:
+    async with MockServer([(udid, viewer_id)]) as srv:
+        srv.route('/load/index', latency=0.2, size=4 << 20)
+        srv.route('/quest/start', error_rate=0.1)
+        c = PCRClient('3.7.0', udid=udid, short_udid='1', viewer_id=viewer_id, server_id=1, api_root=srv.url)
+
+or standalone: python -m nowem.mock_server --port 8080 --account <udid>:<viewer_id>
+"""
+import argparse
+import asyncio
+import logging
+import random
+from collections import Counter
+from typing import Callable, Dict, Iterable, Tuple, Union
+
+from aiohttp import web
+
+from .secret import PCRSecret, pack_response, unpack_buffer
+
+log = logging.getLogger(__name__)
+
+Response = Union[dict, Callable[[dict], dict]]
+
+# canned `data` of the apis a client usually walks through
+DEFAULT_RESPONSES: Dict[str, Response] = {
+    '/check/check_agreement': {},
+    '/check/game_start': {'now_tutorial': False},
+    '/load/index': {
+        'user_info': {'user_name': 'mock', 'team_level': 100, 'user_stamina': 100},
+        'user_jewel': {'free_jewel': 10000, 'paid_jewel': 0},
+        'user_gold': {'gold_id_free': 1000000, 'gold_id_pay': 0},
+        'item_list': [{'type': 2, 'id': 90006, 'stock': 11705}],
+        'unit_list': [],
+        'user_equip': [],
+    },
+    '/profile/get_profile': lambda p: {'user_info': {'viewer_id': p.get('target_viewer_id'), 'user_name': 'mock'}},
+    '/clan/info': {'clan': {'detail': {'clan_id': 1, 'clan_name': 'mock'}, 'members': []}},
+    '/clan/chat_info_list': {'clan_chat_message': [], 'equip_requests': [], 'user_equip_data': []},
+    '/clan_battle/top': {'clan_battle_id': 1, 'lap_num': 1, 'boss_info': []},
+    '/clan_battle/battle_log_list': {'battle_list': []},
+    '/payment/item_list': {'item_list': []},
+}
+
+
+class MockEndpoint:
+    def __init__(self,
+                 response: Response = None,
+                 latency: float = 0.,
+                 size: int = 0,
+                 error_rate: float = 0.,
+                 error_message: str = 'mock server error',
+                 http_error_rate: float = 0.):
+        """
+        response: `data` to answer, or a callable building it from the request params
+        latency: seconds to wait before answering
+        size: pad `data` with a string of this many bytes
+        error_rate: probability to answer a server_error (PCRAPIException on the client)
+        http_error_rate: probability to answer HTTP 500
+        """
+        self.response = response
+        self.latency = latency
+        self.size = size
+        self.error_rate = error_rate
+        self.error_message = error_message
+        self.http_error_rate = http_error_rate
+
+
+class MockServer:
+    def __init__(self, accounts: Iterable[Tuple[str, str]] = (), host: str = '127.0.0.1', port: int = 0):
+        """accounts: (udid, viewer_id) the server knows, requests are matched to them by the SID header"""
+        self.host = host
+        self.port = port
+        self.endpoints: Dict[str, MockEndpoint] = {api: MockEndpoint(r) for api, r in DEFAULT_RESPONSES.items()}
+        self.default = MockEndpoint({})
+        self.requests = Counter()
+
+        self._accounts: Dict[str, Tuple[bytes, str]] = {}
+        for udid, viewer_id in accounts:
+            self.add_account(udid, viewer_id)
+
+        self._runner = None
+
+    def add_account(self, udid: str, viewer_id: str):
+        self._accounts[PCRSecret.md5(viewer_id + udid)] = (udid.replace('-', '')[:16].encode('utf8'), viewer_id)
+
+    def route(self, api: str, response: Response = None, **kwargs) -> MockEndpoint:
+        """configure an api, keeps the canned response when `response` is None"""
+        if response is None and api in self.endpoints:
+            response = self.endpoints[api].response
+        e = self.endpoints[api] = MockEndpoint(response, **kwargs)
+        return e
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    async def handle(self, request: web.Request) -> web.Response:
+        api = request.path
+        self.requests[api] += 1
+        account = self._accounts.get(request.headers.get('SID', ''))
+        if account is None:
+            return web.Response(status=403)
+        iv, viewer_id = account
+
+        e = self.endpoints.get(api, self.default)
+        params, _ = unpack_buffer(iv, bytearray(await request.read()))
+        if e.latency:
+            await asyncio.sleep(e.latency)
+        if e.http_error_rate and random.random() < e.http_error_rate:
+            return web.Response(status=500)
+
+        headers = {'result_code': 1, 'viewer_id': int(viewer_id)}
+        if e.error_rate and random.random() < e.error_rate:
+            headers['result_code'] = 3
+            data = {'server_error': {'status': 3, 'title': 'error', 'message': e.error_message}}
+        else:
+            data = e.response(params) if callable(e.response) else e.response
+            if e.size:
+                data = {**data, 'padding': 'x' * e.size}
+
+        return web.Response(body=pack_response(iv, {'data_headers': headers, 'data': data}),
+                            content_type='application/octet-stream')
+
+    async def start(self):
+        app = web.Application(client_max_size=16 << 20)
+        app.router.add_post('/{api:.*}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+        log.info(f'mock server listening on {self.url}')
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+async def _serve(args):
+    accounts = [a.split(':', 1) for a in args.account]
+    async with MockServer(accounts, args.host, args.port):
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='local stand-in for the game server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--account', action='append', default=[], help='udid:viewer_id, repeatable')
+    logging.basicConfig(level='INFO')
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,32 @@
+import hashlib
+import os
 import plistlib
-
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import unquote
-from re import finditer
 from base64 import b64decode
 from struct import unpack
+from typing import Dict, Optional
+
+import msgpack
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 _KEY_PLAYERPREFS = b'e806f6'
 
+# below it, the int path beats the numpy array setup
+_NUMPY_THRESHOLD = 4096
+
 
 def _xor_endec(b: bytes, key: bytes) -> bytes:
-    return bytes([key[i % len(key)] ^ b[i] for i in range(len(b))])
+    n = len(b)
+    k = (key * (n // len(key) + 1))[:n]
+    if np is not None and n >= _NUMPY_THRESHOLD:
+        return np.bitwise_xor(np.frombuffer(b, np.uint8), np.frombuffer(k, np.uint8)).tobytes()
+    return (int.from_bytes(b, 'little') ^ int.from_bytes(k, 'little')).to_bytes(n, 'little')
 
 
 def _dec_key(s: str) -> bytes:
@@ -22,26 +39,29 @@ def _dec_val(key: str, s: str) -> bytes:
     return _xor_endec(b, key.encode() + _KEY_PLAYERPREFS)
 
 
-def dec_xml(file: str) -> dict:
-    res = {}
-
-    with open(file, 'r') as f:
-        content = f.read()
+def _dec_pair(k: str, v: str):
+    key = _dec_key(k).decode()
+    val = _dec_val(key, v)
 
-    for m in finditer(r'<string name="(.*)">(.*)</string>', content):
-        try:
-            key = _dec_key(m.group(1)).decode()
-        except:
-            continue
+    if key == 'UDID':
+        val = ''.join([chr(val[4 * i + 6] - 10) for i in range(36)])
+    elif len(val) == 4:
+        val = str(unpack('i', val)[0])
+    return key, val
 
-        val = _dec_val(key, m.group(2))
 
-        if key == 'UDID':
-            val = ''.join([chr(val[4 * i + 6] - 10) for i in range(36)])
-        elif len(val) == 4:
-            val = str(unpack('i', val)[0])
+def dec_xml(file: str) -> dict:
+    """Android shared_prefs xml, parsed as a stream"""
+    res = {}
 
-        res[key] = val
+    for _, elem in ET.iterparse(file):
+        if elem.tag == 'string' and 'name' in elem.attrib:
+            try:
+                key, val = _dec_pair(elem.attrib['name'], elem.text or '')
+            except Exception:
+                continue
+            res[key] = val
+        elem.clear()
 
     return res
 
@@ -56,15 +76,53 @@ def dec_plist_xml(file: str) -> dict:
         pl: dict = plistlib.load(f)
         for k, v in pl.items():
             try:
-                key = _dec_key(k).decode()
-                val = _dec_val(key, v)
+                key, val = _dec_pair(k, v)
             except Exception:
-                ...
-
-            if key == 'UDID':
-                val = ''.join([chr(val[4 * i + 6] - 10) for i in range(36)])
-            elif len(val) == 4:
-                val = str(unpack('i', val)[0])
+                continue
             res[key] = val
 
     return res
+
+
+def dec_file(file: str) -> dict:
+    return dec_plist_xml(file) if file.endswith('.plist') else dec_xml(file)
+
+
+def dec_dir(path: str, cache_dir: Optional[str] = None, max_workers: int = None) -> Dict[str, dict]:
+    """decode every .xml and .plist in `path`, return {file path: prefs}
+
+    files are decoded in a process pool. with `cache_dir`, results are kept there keyed by the sha1 of the file,
+    so unchanged files are not decoded again on the next import
+    """
+    files = sorted(os.path.join(path, n) for n in os.listdir(path) if n.endswith(('.xml', '.plist')))
+    res: Dict[str, dict] = {}
+    todo: Dict[str, str] = {}
+
+    for file in files:
+        if cache_dir is None:
+            todo[file] = ''
+            continue
+        with open(file, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        try:
+            with open(os.path.join(cache_dir, f'{digest}.msgpack'), 'rb') as f:
+                res[file] = msgpack.unpackb(f.read(), raw=False)
+        except (OSError, ValueError):
+            todo[file] = digest
+
+    if len(todo) > 1:
+        with ProcessPoolExecutor(max_workers) as ex:
+            decoded = dict(zip(todo, ex.map(dec_file, todo, chunksize=max(1, len(todo) // 64))))
+    else:
+        decoded = {file: dec_file(file) for file in todo}
+
+    if cache_dir is not None and decoded:
+        os.makedirs(cache_dir, exist_ok=True)
+        for file, prefs in decoded.items():
+            cache = os.path.join(cache_dir, f'{todo[file]}.msgpack')
+            with open(f'{cache}.tmp', 'wb') as f:
+                f.write(msgpack.packb(prefs, use_bin_type=True))
+            os.replace(f'{cache}.tmp', cache)
+
+    res.update(decoded)
+    return {file: res[file] for file in files}
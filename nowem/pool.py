@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Tuple, Union
+
+from .client import PCRClient
+from .playerprefs import dec_plist_xml
+from .ratelimit import RateLimiter
+from .transport import Transport, AiohttpTransport
+
+log = logging.getLogger(__name__)
+
+
+class ClientPool:
+    """run many accounts at once
+
+    accounts can be playerprefs files (.xml or .plist), credential dicts (kwargs of PCRClient) or PCRClient; like a
+    transport, a PCRClient passed in is owned by the caller and not closed by the pool.
+    calls on a single account are serialized, at most `concurrency` accounts are working at the same time
+    """
+
+    def __init__(self,
+                 version: str,
+                 accounts: Iterable[Union[str, dict, PCRClient]],
+                 *,
+                 concurrency: int = 16,
+                 transport: Transport = None,
+                 limiter: RateLimiter = None,
+                 **client_kwargs):
+        self._own_transport = transport is None
+        self.transport = transport or AiohttpTransport()
+        self.limiter = limiter or RateLimiter()
+        client_kwargs['limiter'] = self.limiter
+        self.sem = asyncio.Semaphore(concurrency)
+
+        self.clients: List[PCRClient] = []
+        self._own_clients: List[PCRClient] = []
+        for a in accounts:
+            if isinstance(a, PCRClient):
+                self.clients.append(a)
+                continue
+            if isinstance(a, str):
+                if a.endswith('.plist'):
+                    c = PCRClient(version, pp_xml=dec_plist_xml(a), transport=self.transport, **client_kwargs)
+                else:
+                    c = PCRClient(version, playerprefs=a, transport=self.transport, **client_kwargs)
+            else:
+                c = PCRClient(version, transport=self.transport, **{**client_kwargs, **a})
+            self.clients.append(c)
+            self._own_clients.append(c)
+
+        self._locks: Dict[int, asyncio.Lock] = {id(c): asyncio.Lock() for c in self.clients}
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __iter__(self):
+        return iter(self.clients)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        for c in self._own_clients:
+            await c.close()
+        if self._own_transport:
+            await self.transport.close()
+
+    async def run(self, c: PCRClient, fn: Callable[[PCRClient], Awaitable[Any]]) -> Any:
+        """run fn(c) holding the account lock and a slot of the global concurrency
+
+        the lock comes first, calls queued on a busy account must not hold slots the other accounts could use
+        """
+        async with self._locks[id(c)]:
+            async with self.sem:
+                return await fn(c)
+
+    async def map(self, fn: Callable[[PCRClient], Awaitable[Any]],
+                  return_exceptions: bool = False) -> AsyncIterator[Tuple[PCRClient, Any]]:
+        """yield (client, fn(client)) for every account, in completion order"""
+        # partials and callable objects have no __name__
+        name = getattr(fn, '__name__', repr(fn))
+
+        async def one(c: PCRClient):
+            try:
+                return c, await self.run(c, fn)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                log.warning(f'{name} failed on viewer_id={c.sec.viewer_id}: {e!r}')
+                return c, e
+
+        tasks = [asyncio.ensure_future(one(c)) for c in self.clients]
+        try:
+            for t in asyncio.as_completed(tasks):
+                yield await t
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def login(self) -> List[Tuple[PCRClient, Exception]]:
+        """login every account, return the failed ones"""
+        failed = []
+        async for c, r in self.map(PCRClient.login, return_exceptions=True):
+            if isinstance(r, Exception):
+                failed.append((c, r))
+        return failed
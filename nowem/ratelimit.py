@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+
+from .exception import PCRHTTPException
+
+# (rate per second, burst)
+Policy = Tuple[float, float]
+
+# failures of the way to the server, the host backs off on them
+TRANSPORT_ERRORS = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def is_congestion(e: BaseException) -> bool:
+    """whether a failure means the host is struggling: transport errors, timeouts, HTTP 429 and 5xx
+
+    game errors, other 4xx (e.g. bad credentials of one account) and undecodable bodies are answers of a healthy host
+    """
+    if isinstance(e, PCRHTTPException):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, TRANSPORT_ERRORS)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """take a token, return how long to wait before it can be used"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.
+
+
+class RateLimiter:
+    """space requests before they are sent
+
+    every request takes a token from the bucket of its account, of its api group (longest matching prefix in
+    `groups`, per account) and of its server host. share one RateLimiter among clients to make host limits work.
+    after a congestion failure (see is_congestion) the host is blocked with exponential backoff, reset by the next
+    success; any other failure counts as a success, it proves the host answers.
+    """
+
+    def __init__(self,
+                 account: Optional[Policy] = (2, 3),
+                 host: Optional[Policy] = None,
+                 groups: Dict[str, Policy] = None,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30):
+        self.account = account
+        self.host = host
+        self.groups = groups or {}
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._errors: Dict[str, int] = {}
+        self._blocked_until: Dict[str, float] = {}
+
+    def _bucket(self, key: tuple, policy: Policy) -> TokenBucket:
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = TokenBucket(*policy)
+        return b
+
+    def _group(self, api: str) -> Optional[str]:
+        best = None
+        for prefix in self.groups:
+            if api.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return best
+
+    def _host_key(self, client) -> str:
+        return urlsplit(client.api_root).netloc
+
+    async def acquire(self, client, api: str) -> float:
+        """wait until the request can be sent, return the seconds waited"""
+        account = id(client)
+        host = self._host_key(client)
+
+        delay = self._blocked_until.get(host, 0.) - time.monotonic()
+        if self.host:
+            delay = max(delay, self._bucket(('host', host), self.host).reserve())
+        if self.account:
+            delay = max(delay, self._bucket(('account', account), self.account).reserve())
+        group = self._group(api)
+        if group is not None:
+            delay = max(delay, self._bucket(('group', account, group), self.groups[group]).reserve())
+
+        if delay <= 0:
+            return 0.
+        await asyncio.sleep(delay)
+        return delay
+
+    def on_success(self, client):
+        self._errors.pop(self._host_key(client), None)
+
+    def on_error(self, client):
+        host = self._host_key(client)
+        n = self._errors.get(host, 0)
+        self._errors[host] = n + 1
+        until = time.monotonic() + min(self.backoff_max, self.backoff_base * 2 ** n)
+        self._blocked_until[host] = max(self._blocked_until.get(host, 0.), until)
@@ -0,0 +1,95 @@
+"""record the traffic of PCRClient and serve it back offline
+
+    with Recorder('traffic.rec') as rec:
+        c = PCRClient(..., recorder=rec)
+        ...
+
+    c = PCRClient(..., transport=ReplayTransport('traffic.rec', udid, speed=10))
+
+the log is a stream of msgpack maps, appended one per request:
+    {'t': unix time, 'api': path, 'dt': seconds from send to decoded, 'params': request params, 'response': whole
+    decoded response, a server_error one included}
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import AsyncIterator, Deque, Dict, Iterator
+from urllib.parse import urlsplit
+
+import msgpack
+
+from .exception import PCRAPIException
+from .secret import pack_response
+from .transport import Transport
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    with open(path, 'rb') as f:
+        yield from msgpack.Unpacker(f, raw=False, strict_map_key=False)
+
+
+class Recorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def record(self, api: str, params: dict, response: dict, dt: float):
+        self._f.write(msgpack.packb({'t': time.time(), 'api': api, 'dt': dt, 'params': params, 'response': response},
+                                    use_bin_type=True))
+
+    def record_error(self, api: str, params: dict, e: PCRAPIException, dt: float):
+        self.record(api, params, {'data_headers': {'result_code': e.result_code},
+                                  'data': {'server_error': {'message': e.message, 'status': e.status}}}, dt)
+
+    def flush(self):
+        self._f.flush()
+
+
+class ReplayResponse:
+    status_code = 200
+    ok = True
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.headers = {'Content-Length': str(len(body))}
+
+    @property
+    async def content(self) -> bytes:
+        return self.body
+
+    async def iter_chunks(self, size: int = 65536) -> AsyncIterator[bytes]:
+        yield self.body
+
+
+class ReplayTransport(Transport):
+    """answer every api with its next recorded response, in recording order
+
+    `udid` is the one of the recorded account, responses are encrypted again for it.
+    speed: 1 waits the recorded latency, 10 ten times less, 0 does not wait
+    """
+
+    def __init__(self, path: str, udid: str, speed: float = 1.):
+        self.iv = udid.replace('-', '')[:16].encode('utf8')
+        self.speed = speed
+        self.records: Dict[str, Deque[dict]] = defaultdict(deque)
+        for r in iter_records(path):
+            self.records[r['api']].append(r)
+
+    async def request(self, method: str, url: str, span=None, **kwargs) -> ReplayResponse:
+        api = urlsplit(url).path
+        try:
+            r = self.records[api].popleft()
+        except IndexError:
+            raise LookupError(f'no recording left for {api}')
+        if self.speed:
+            await asyncio.sleep(r['dt'] / self.speed)
+        return ReplayResponse(pack_response(self.iv, r['response']))
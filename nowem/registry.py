@@ -0,0 +1,200 @@
+"""accounts kept in one SQLite file, so that fleets are not rebuilt from playerprefs on every run
+
+    with AccountRegistry('accounts.db') as reg:
+        reg.import_dir('prefs/', tags=['farm'])
+        for c in reg.clients('3.7.0', server_id=3, clan_id=42, not_run_since=time.time() - 86400):
+            await reg.login(c)
+            ...
+            reg.mark_run(c)
+"""
+import json
+import logging
+import sqlite3
+import time
+from typing import Iterable, List, Optional
+
+from . import client
+from . import session
+from .playerprefs import dec_dir
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS accounts (
+    viewer_id TEXT PRIMARY KEY,
+    udid TEXT NOT NULL,
+    short_udid TEXT NOT NULL,
+    server_id INTEGER NOT NULL,
+    clan_id INTEGER,
+    session TEXT,
+    last_login REAL,
+    last_run REAL
+);
+CREATE INDEX IF NOT EXISTS accounts_server_clan ON accounts (server_id, clan_id);
+CREATE INDEX IF NOT EXISTS accounts_last_run ON accounts (last_run);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT NOT NULL,
+    viewer_id TEXT NOT NULL REFERENCES accounts (viewer_id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, viewer_id)
+) WITHOUT ROWID;
+'''
+
+
+def _str(v) -> str:
+    return v.decode() if isinstance(v, bytes) else str(v)
+
+
+class AccountRegistry:
+    """udid, short_udid, viewer_id, server_id, clan_id, login session and tags of accounts, keyed by viewer_id
+
+    rows are plain dicts with those columns plus last_login and last_run (unix times).
+    every write is committed at once
+    """
+
+    def __init__(self, path: str = 'accounts.db'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM accounts').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def add(self, udid: str, short_udid: str, viewer_id: str, server_id: int, clan_id: int = None,
+            tags: Iterable[str] = ()):
+        """insert an account, or update the credentials of a known viewer_id"""
+        with self.db:
+            self._add(udid, short_udid, viewer_id, server_id, clan_id, tags)
+
+    def _add(self, udid, short_udid, viewer_id, server_id, clan_id, tags):
+        viewer_id = _str(viewer_id)
+        self.db.execute('INSERT INTO accounts (viewer_id, udid, short_udid, server_id, clan_id) VALUES (?, ?, ?, ?, ?) '
+                        'ON CONFLICT (viewer_id) DO UPDATE SET udid = excluded.udid, short_udid = excluded.short_udid, '
+                        'server_id = excluded.server_id, clan_id = COALESCE(excluded.clan_id, clan_id)',
+                        (viewer_id, _str(udid), _str(short_udid), int(server_id), clan_id))
+        self.db.executemany('INSERT OR IGNORE INTO tags (tag, viewer_id) VALUES (?, ?)',
+                            [(t, viewer_id) for t in tags])
+
+    def import_prefs(self, prefs: Iterable[dict], tags: Iterable[str] = ()) -> int:
+        """add decoded playerprefs, return how many were added"""
+        tags = list(tags)
+        n = 0
+        with self.db:
+            for pp in prefs:
+                try:
+                    self._add(pp['UDID'], pp['SHORT_UDID'], pp['VIEWER_ID'], pp['TW_SERVER_ID'], None, tags)
+                except KeyError as e:
+                    log.warning(f'playerprefs without {e}, skipped')
+                    continue
+                n += 1
+        return n
+
+    def import_dir(self, path: str, cache_dir: Optional[str] = None, tags: Iterable[str] = ()) -> int:
+        """add every playerprefs .xml/.plist of a directory, see playerprefs.dec_dir"""
+        return self.import_prefs(dec_dir(path, cache_dir).values(), tags)
+
+    def remove(self, viewer_id: str):
+        with self.db:
+            self.db.execute('DELETE FROM accounts WHERE viewer_id = ?', (_str(viewer_id),))
+
+    def get(self, viewer_id: str) -> Optional[dict]:
+        row = self.db.execute('SELECT * FROM accounts WHERE viewer_id = ?', (_str(viewer_id),)).fetchone()
+        return dict(row) if row else None
+
+    def tag(self, viewer_id: str, *tags: str):
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO tags (tag, viewer_id) VALUES (?, ?)',
+                                [(t, _str(viewer_id)) for t in tags])
+
+    def untag(self, viewer_id: str, *tags: str):
+        with self.db:
+            self.db.executemany('DELETE FROM tags WHERE tag = ? AND viewer_id = ?',
+                                [(t, _str(viewer_id)) for t in tags])
+
+    def tags(self, viewer_id: str) -> List[str]:
+        return [r[0] for r in self.db.execute('SELECT tag FROM tags WHERE viewer_id = ? ORDER BY tag',
+                                              (_str(viewer_id),))]
+
+    def set_clan(self, viewer_id: str, clan_id: Optional[int]):
+        with self.db:
+            self.db.execute('UPDATE accounts SET clan_id = ? WHERE viewer_id = ?', (clan_id, _str(viewer_id)))
+
+    def find(self,
+             server_id: int = None,
+             clan_id: int = None,
+             tag: str = None,
+             not_run_since: float = None,
+             limit: int = None) -> List[dict]:
+        """accounts matching every given condition, not_run_since also matches the ones never run"""
+        sql = 'SELECT a.* FROM accounts a'
+        where, args = [], []
+        if tag is not None:
+            sql += ' JOIN tags t ON t.viewer_id = a.viewer_id AND t.tag = ?'
+            args.append(tag)
+        if server_id is not None:
+            where.append('a.server_id = ?')
+            args.append(server_id)
+        if clan_id is not None:
+            where.append('a.clan_id = ?')
+            args.append(clan_id)
+        if not_run_since is not None:
+            where.append('(a.last_run IS NULL OR a.last_run < ?)')
+            args.append(not_run_since)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY a.viewer_id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+        return [dict(r) for r in self.db.execute(sql, args)]
+
+    def clients(self,
+                version: str,
+                *,
+                server_id: int = None,
+                clan_id: int = None,
+                tag: str = None,
+                not_run_since: float = None,
+                limit: int = None,
+                **client_kwargs) -> List['client.PCRClient']:
+        """PCRClient of every account find() returns, client_kwargs go to all of them (transport, limiter...)"""
+        return [client.PCRClient(version, udid=a['udid'], short_udid=a['short_udid'], viewer_id=a['viewer_id'],
+                                 server_id=a['server_id'], **client_kwargs)
+                for a in self.find(server_id, clan_id, tag, not_run_since, limit)]
+
+    def save_session(self, c: 'client.PCRClient'):
+        with self.db:
+            self.db.execute('UPDATE accounts SET session = ?, last_login = ? WHERE viewer_id = ?',
+                            (json.dumps(c.snapshot(), ensure_ascii=False, separators=(',', ':')), time.time(),
+                             c.sec.viewer_id))
+
+    def load_session(self, viewer_id: str, max_age: float = 86400) -> Optional[dict]:
+        """the stored snapshot, None when there is none or it is too old, like session.load()"""
+        row = self.db.execute('SELECT session FROM accounts WHERE viewer_id = ?', (_str(viewer_id),)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        snap = json.loads(row[0])
+        return snap if session.is_fresh(snap, max_age) else None
+
+    async def login(self, c: 'client.PCRClient', max_age: float = 86400):
+        """like PCRClient.login(snapshot=...), with the session stored in the registry"""
+        if await c.try_restore(self.load_session(c.sec.viewer_id, max_age)):
+            return
+        await c.login()
+        self.save_session(c)
+
+    def mark_run(self, c: 'client.PCRClient', t: float = None):
+        with self.db:
+            self.db.execute('UPDATE accounts SET last_run = ? WHERE viewer_id = ?',
+                            (time.time() if t is None else t, c.sec.viewer_id))
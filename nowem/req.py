@@ -4,132 +4,99 @@ import logging
 import random
 import re
 import string
-from typing import Union
+from typing import Callable, Dict, Union
 
 from . import client
 from .secret import PCRSecret
 
 log = logging.getLogger(__name__)
 
+# api path -> param builder, filled at import by _compile()
+ROUTES: Dict[str, Callable[..., dict]] = {}
+
+# apis that only read, safe to be shared or sent twice
+IDEMPOTENT_APIS = frozenset({
+    '/load/index',
+    '/profile/get_profile',
+    '/clan/info',
+    '/clan/chat_info_list',
+    '/clan_battle/top',
+    '/clan_battle/battle_log_list',
+    '/payment/item_list',
+    '/present/index',
+    '/mission/index',
+})
+
+# reads whose answer is the same whichever account asks, the only ones that may be shared across accounts
+ACCOUNT_FREE_APIS = frozenset({
+    '/profile/get_profile',
+})
+
+# prefixes of the apis whose answers carry deltas of the account's own game_data, only these are merged into it.
+# profile, payment and clan answers hold other players' records or full listings and must never be
+STATE_APIS = (
+    '/quest/',
+    '/shop/',
+    '/present/',
+    '/mission/',
+    '/daily_task/',
+    '/room/',
+    '/story/',
+    '/event/',
+    '/home/',
+    '/tutorial/',
+    '/equipment/',
+    '/chara_fortune/',
+)
+
 
 def end_point(func):
+    """the decorated method returns the params, its api path is resolved once at import"""
+
     @functools.wraps(func)
-    async def dec(*args, **kwargs) -> _Req:
-        self = args[0]
-        self.api += f'/{func.__name__}'
+    async def dec(self, *args, **kwargs):
         no_headers = kwargs.pop('no_headers', True)
-        latency = kwargs.pop('latency', 0.5)
-
-        func(*args, **kwargs)
-
-        res = await self.client.req(self.api, self.params, no_headers)
-        await asyncio.sleep(latency)
+        # requests are spaced by client.limiter, an explicit latency still sleeps after the call
+        latency = kwargs.pop('latency', None)
+
+        res = await self.client.req(dec.api, func(self, *args, **kwargs), no_headers)
+        if latency:
+            await asyncio.sleep(latency)
+            if self.client.tracer is not None:
+                self.client.tracer.record(dec.api, 'sleep', latency)
         return res
 
+    dec.api = ''
+    dec.build = func
     return dec
 
 
 def route_only(cls):
-    def fake_init(self, r: _Req):
-        self.api = r.api + f"/{re.sub(r'(?<!^)(?=[A-Z])', '_', cls.__name__).lower()}"
-        self.client = r.client
-        self.params = r.params
-
-    cls.__init__ = fake_init
+    cls.name = re.sub(r'(?<!^)(?=[A-Z])', '_', cls.__name__).lower()
     return cls
 
 
 class _Req:
-    def __init__(self):
-        self.client: Union['client.PCRClient', None] = None
-        self.api = ''
-        self.params = {}
-
+    api = ''
 
-class ReqDispatcher(_Req):
     def __init__(self, c: 'client.PCRClient'):
-        super().__init__()
-        self.client = c
-
-    @property
-    def daily_task(self):
-        return DailyTask(self)
-
-    @property
-    def check(self):
-        return Check(self)
-
-    @property
-    def load(self):
-        return Load(self)
-
-    @property
-    def home(self):
-        return Home(self)
-
-    @property
-    def clan(self):
-        return Clan(self)
-
-    @property
-    def clan_battle(self):
-        return ClanBattle(self)
+        self.client: Union['client.PCRClient', None] = c
 
-    @property
-    def profile(self):
-        return Profile(self)
 
-    @property
-    def payment(self):
-        return Payment(self)
+class _Route:
+    """a sub route, instantiated on first access and then cached on the parent"""
 
-    @property
-    def equipment(self):
-        return Equipment(self)
+    def __init__(self, cls):
+        self.cls = cls
 
-    @property
-    def tutorial(self):
-        return Tutorial(self)
+    def __set_name__(self, owner, name):
+        self.name = name
 
-    @property
-    def quest(self):
-        return Quest(self)
-
-    @property
-    def shop(self):
-        return Shop(self)
-
-    @property
-    def mission(self):
-        return Mission(self)
-
-    @property
-    def room(self):
-        return Room(self)
-
-    @property
-    def event(self):
-        return Event(self)
-
-    @property
-    def story(self):
-        return Story(self)
-
-    @property
-    def present(self):
-        return Present(self)
-
-    @property
-    def account(self):
-        return Account(self)
-
-    @property
-    def tool(self):
-        return Tool(self)
-
-    @property
-    def chara_fortune(self):
-        return CharaFortune(self)
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        r = obj.__dict__[self.name] = self.cls(obj.client)
+        return r
 
 
 @route_only
@@ -140,7 +107,7 @@ class DailyTask(_Req):
         "setting_alchemy_count": 1,
         "is_check_by_term_normal_gacha": 0,
         }"""
-        self.params = {
+        return {
             'settings_alchemy_count': setting_alchemy_count,
             'is_check_by_term_normal_gacha': is_check_by_term_normal_gacha,
         }
@@ -150,36 +117,36 @@ class DailyTask(_Req):
 class CharaFortune(_Req):
     @end_point
     def draw(self, fortune_id: int, unit_id: int):  # anniversary
-        self.params = {'fortune_id': fortune_id, 'unit_id': unit_id}
+        return {'fortune_id': fortune_id, 'unit_id': unit_id}
 
 
 @route_only
 class Tool(_Req):
     @end_point
     def check_agreement(self):
-        self.params = {}
+        return {}
 
     @end_point
     def signup(self):
-        self.params = {'carrier': 'OnePlus', 'agreement_ver': 1002, 'policy_ver': 2001}
+        return {'carrier': 'OnePlus', 'agreement_ver': 1002, 'policy_ver': 2001}
 
 
 @route_only
 class Account(_Req):
     @end_point
     def publish_transition_code(self, pwd: str):
-        self.params = {'password': PCRSecret.md5(pwd)}
+        return {'password': PCRSecret.md5(pwd)}
 
 
 @route_only
 class Present(_Req):
     @end_point
     def index(self):
-        self.params = {'time_filter': -1, 'type_filter': 0, 'desc_flag': True, 'offset': 0}
+        return {'time_filter': -1, 'type_filter': 0, 'desc_flag': True, 'offset': 0}
 
     @end_point
     def receive_all(self):
-        self.params = {'time_filter': -1, 'type_filter': 0, 'desc_flag': True}
+        return {'time_filter': -1, 'type_filter': 0, 'desc_flag': True}
 
 
 @route_only
@@ -204,15 +171,15 @@ class Story(_Req):
 
     @end_point
     def check(self, story_id: int):
-        self.params = {'story_id': story_id}
+        return {'story_id': story_id}
 
     @end_point
     def start(self, story_id: int):
-        self.params = {'story_id': story_id}
+        return {'story_id': story_id}
 
     @end_point
     def force_release(self, story_group_id: int):
-        self.params = {'story_group_id': story_group_id}
+        return {'story_group_id': story_group_id}
 
 
 @route_only
@@ -221,29 +188,29 @@ class Event(_Req):
     class Hatsune(_Req):
         @end_point
         def top(self, event_id: int):
-            self.params = {'event_id': event_id}
+            return {'event_id': event_id}
 
         @end_point
         def gacha_index(self, event_id: int):
-            self.params = {'event_id': event_id, 'gacha_id': event_id}
+            return {'event_id': event_id, 'gacha_id': event_id}
 
         @end_point
         def gacha_exec(self, event_id: int, gacha_times: int, current_cost_num: int):
-            self.params = {'event_id': event_id, 'gacha_id': event_id,
-                           'gacha_times': gacha_times, 'current_cost_num': current_cost_num,
-                           'loop_box_multi_gacha_flag': 0}
+            return {'event_id': event_id, 'gacha_id': event_id,
+                    'gacha_times': gacha_times, 'current_cost_num': current_cost_num,
+                    'loop_box_multi_gacha_flag': 0}
 
         @end_point
         def quest_top(self, event_id: int):
-            self.params = {'event_id': event_id}
+            return {'event_id': event_id}
 
         @end_point
         def boss_battle_start(self, event_id: int, boss_id: int, current_ticket_num: int):
-            self.params = {'event_id': event_id, 'boss_id': boss_id, 'current_ticket_num': current_ticket_num}
+            return {'event_id': event_id, 'boss_id': boss_id, 'current_ticket_num': current_ticket_num}
 
         # @end_point
         # def boss_battle_finish(self, event_id: int, boss_id: int):
-        #     self.params = {'event_id': event_id, 'boss_id': boss_id}
+        #     return {'event_id': event_id, 'boss_id': boss_id}
         # complex, pass
 
         @end_point
@@ -251,57 +218,56 @@ class Event(_Req):
                         support_battle_rarity: int = 0, is_friend: bool = False):
             # quest_id = 11000000 + chap_n * 1000 + map_n (normal)
             # quest_id = 12000000 + chap_n * 1000 + map_n (hard)
-            self.params = {'event_id': int(event_id),
-                           'quest_id': int(quest_id),
-                           'token': self.client.token,
-                           'owner_viewer_id': owner_viewer_id,
-                           'support_unit_id': support_unit_id,
-                           'support_battle_rarity': support_battle_rarity,
-                           'is_friend': 1 if is_friend else 0}
+            return {'event_id': int(event_id),
+                    'quest_id': int(quest_id),
+                    'token': self.client.token,
+                    'owner_viewer_id': owner_viewer_id,
+                    'support_unit_id': support_unit_id,
+                    'support_battle_rarity': support_battle_rarity,
+                    'is_friend': 1 if is_friend else 0}
 
         @end_point
         def quest_finish(self, event_id: int, quest_start_result: dict, auto_clear: bool = False,
                          owner_viewer_id: int = 0,
                          support_position: int = 0,
                          is_friend: bool = False):
-            self.params = {'event_id': event_id, 'quest_id': quest_start_result['quest_id'],
-                           'remain_time': 73479,
-                           'unit_hp_list': [],
-                           'auto_clear': 1 if auto_clear else 0, 'fps': 60,
-                           'owner_viewer_id': owner_viewer_id, 'support_position': support_position,
-                           'is_friend': 1 if is_friend else 0}
+            params = {'event_id': event_id, 'quest_id': quest_start_result['quest_id'],
+                      'remain_time': 73479,
+                      'unit_hp_list': [],
+                      'auto_clear': 1 if auto_clear else 0, 'fps': 60,
+                      'owner_viewer_id': owner_viewer_id, 'support_position': support_position,
+                      'is_friend': 1 if is_friend else 0}
             for i in quest_start_result['skin_data_for_request']:
-                self.params['unit_hp_list'].append(
+                params['unit_hp_list'].append(
                     {'viewer_id': self.client.sec.viewer_id, 'unit_id': i['unit_id'], 'hp': 100})
             for i in quest_start_result['quest_wave_info'][2]['enemy_info_list']:
-                self.params['unit_hp_list'].append({'viewer_id': 0, 'unit_id': i['enemy_id'], 'hp': 0})
+                params['unit_hp_list'].append({'viewer_id': 0, 'unit_id': i['enemy_id'], 'hp': 0})
+            return params
 
-    @property
-    def hatsune(self):
-        return Event.Hatsune(self)
+    hatsune = _Route(Hatsune)
 
 
 @route_only
 class Room(_Req):
     @end_point
     def start(self):
-        self.params = {}
+        return {}
 
     @end_point
     def receive_all(self):
-        self.params = {}
+        return {}
 
     @end_point
     def level_up_start(self, serial_id: int, floor_number: int = 1):
         # 5:stamina 6:exp 7:mana
-        self.params = {'floor_number': floor_number, 'serial_id': serial_id}
+        return {'floor_number': floor_number, 'serial_id': serial_id}
 
 
 @route_only
 class Mission(_Req):
     @end_point
     def index(self):
-        self.params = {'request_flag': {'quest_clear_rank': 0}}
+        return {'request_flag': {'quest_clear_rank': 0}}
 
     @end_point
     def accept(self, type: int, id: int = 0, buy_id: int = 0):
@@ -311,18 +277,18 @@ class Mission(_Req):
         #   4: medal
         # id:
         #   0: all
-        self.params = {'type': type, 'id': id, 'buy_id': buy_id}
+        return {'type': type, 'id': id, 'buy_id': buy_id}
 
 
 @route_only
 class Check(_Req):
     @end_point
     def check_agreement(self):
-        self.params = {}
+        return {}
 
     @end_point
     def game_start(self):
-        self.params = {
+        return {
             'app_type': 0,
             'campaign_data': '',
             'campaign_sign': '38082d22ef968d0e2c3fdd7cea75d716',
@@ -338,42 +304,45 @@ class Check(_Req):
 class Load(_Req):
     @end_point
     def index(self):
-        self.params = {'carrier': 'OnePlus'}
+        return {'carrier': 'OnePlus'}
 
 
 @route_only
 class Tutorial(_Req):
     @end_point
     def update_step(self, step: int, skip: int, user_name: str = ''):
-        self.params = {'step': step, 'skip': skip, 'user_name': user_name}
+        return {'step': step, 'skip': skip, 'user_name': user_name}
 
 
 @route_only
 class Home(_Req):
     @end_point
     def index(self, message_id: int, is_first: bool):
-        self.params = {'message_id': message_id,
-                       'tips_id_list': [],
-                       'is_first': 1 if is_first else 0,
-                       'gold_history': 0}
+        return {'message_id': message_id,
+                'tips_id_list': [],
+                'is_first': 1 if is_first else 0,
+                'gold_history': 0}
 
 
 @route_only
 class Clan(_Req):
     @end_point
     def info(self):
-        self.params = {'clan_id': 0, 'get_user_equip': 1}
+        return {'clan_id': 0, 'get_user_equip': 1}
 
     @end_point
-    def chat_info_list(self, clan_id, count: int = 10, wait_interval: int = 3, search_date: str = '2099-12-31'):
-        self.params = {
+    def chat_info_list(self, clan_id, count: int = 10, wait_interval: int = 3, search_date: str = '2099-12-31',
+                       start_message_id: int = 0, update_message_ids: list[int] = ()):
+        # start_message_id: only messages after it are sent back, 0 for the latest ones
+        # update_message_ids: messages (e.g. equip requests) whose state should be sent again
+        return {
             'clan_id': clan_id,
-            'start_message_id': 0,
+            'start_message_id': start_message_id,
             'search_date': search_date,
             'direction': 1,
             'count': count,
             'wait_interval': wait_interval,
-            'update_message_ids': [],
+            'update_message_ids': list(update_message_ids),
         }
 
 
@@ -386,7 +355,7 @@ class ClanBattle(_Req):
         "is_first": 1,
         "current_clan_battle_coin": 11705, // data.item_list.where(lambda x:x['type']==2 and x['id']==90006)['stock']
         }"""
-        self.params = {
+        return {
             'clan_id': clan_id,
             'is_first': is_first,
             'current_clan_battle_coin': current_clan_battle_coin,
@@ -413,7 +382,7 @@ class ClanBattle(_Req):
         "sort_type": 1,
         "page": 1,
         }"""
-        self.params = {
+        return {
             'cland_battle_id': cland_battle_id,
             'order_num': order_num,
             'phases': phases,
@@ -432,68 +401,107 @@ class Shop(_Req):
         jewel = self.client.game_data['user_jewel']['free_jewel'] + self.client.game_data['user_jewel']['paid_jewel']
         if jewel < 100:
             log.warning(f'low jewel:{jewel}')
-        self.params = {'current_currency_num': jewel}
+        return {'current_currency_num': jewel}
 
 
 @route_only
 class Profile(_Req):
     @end_point
     def get_profile(self, uid: int):
-        self.params = {'target_viewer_id': uid}
+        return {'target_viewer_id': uid}
 
 
 @route_only
 class Payment(_Req):
     @end_point
     def item_list(self):
-        self.params = {}
+        return {}
 
     @end_point
     def send_log(self, log_key: str = None, log_message: str = None):
-        self.params = {'log_key': log_key or 'evInitializeFailed',
-                       'log_message': log_message or 'Error checking for billing v3 support. (response: 3:Unknown IAB '
-                                                     'Helper Error)'}
+        return {'log_key': log_key or 'evInitializeFailed',
+                'log_message': log_message or 'Error checking for billing v3 support. (response: 3:Unknown IAB '
+                                              'Helper Error)'}
 
 
 @route_only
 class Quest(_Req):
     @end_point
     def quest_skip(self, quest_id: int, random_count: int, current_ticket_num: int):
-        self.params = {'quest_id': quest_id, 'random_count': random_count, 'current_ticket_num': current_ticket_num}
+        return {'quest_id': quest_id, 'random_count': random_count, 'current_ticket_num': current_ticket_num}
 
     @end_point
     def start(self, quest_id: int, owner_viewer_id: int = 0, support_unit_id: int = 0,
               support_battle_rarity: int = 0, is_friend: bool = False):
         # quest_id = 11000000 + chap_n * 1000 + map_n (normal)
         # quest_id = 12000000 + chap_n * 1000 + map_n (hard)
-        self.params = {'quest_id': quest_id,
-                       'token': ''.join(random.choices(string.digits, k=16)),
-                       'owner_viewer_id': owner_viewer_id,
-                       'support_unit_id': support_unit_id,
-                       'support_battle_rarity': support_battle_rarity,
-                       'is_friend': 1 if is_friend else 0}
+        return {'quest_id': quest_id,
+                'token': ''.join(random.choices(string.digits, k=16)),
+                'owner_viewer_id': owner_viewer_id,
+                'support_unit_id': support_unit_id,
+                'support_battle_rarity': support_battle_rarity,
+                'is_friend': 1 if is_friend else 0}
 
     @end_point
     def finish(self, quest_start_result: dict, auto_clear: bool = False, owner_viewer_id: int = 0,
                support_position: int = 0,
                is_friend: bool = False):
-        self.params = {'quest_id': quest_start_result['quest_id'], 'remain_time': 73479,
-                       'unit_hp_list': [],
-                       'auto_clear': 1 if auto_clear else 0, 'fps': 60,
-                       'owner_viewer_id': owner_viewer_id, 'support_position': support_position,
-                       'is_friend': 1 if is_friend else 0}
+        params = {'quest_id': quest_start_result['quest_id'], 'remain_time': 73479,
+                  'unit_hp_list': [],
+                  'auto_clear': 1 if auto_clear else 0, 'fps': 60,
+                  'owner_viewer_id': owner_viewer_id, 'support_position': support_position,
+                  'is_friend': 1 if is_friend else 0}
         for i in quest_start_result['skin_data_for_request']:
-            self.params['unit_hp_list'].append(
+            params['unit_hp_list'].append(
                 {'viewer_id': self.client.sec.viewer_id, 'unit_id': i['unit_id'], 'hp': 100})
         for i in quest_start_result['quest_wave_info'][2]['enemy_info_list']:
-            self.params['unit_hp_list'].append({'viewer_id': 0, 'unit_id': i['enemy_id'], 'hp': 0})
+            params['unit_hp_list'].append({'viewer_id': 0, 'unit_id': i['enemy_id'], 'hp': 0})
+        return params
 
 
 @route_only
 class Equipment(_Req):
     @end_point
     def donate(self, clan_id: int, message_id: int, donation_num: int, current_equip_num: int):
-        self.params = {'clan_id': clan_id,
-                       'message_id': message_id,
-                       'donation_num': donation_num,
-                       'current_equip_num': current_equip_num}
+        return {'clan_id': clan_id,
+                'message_id': message_id,
+                'donation_num': donation_num,
+                'current_equip_num': current_equip_num}
+
+
+class ReqDispatcher(_Req):
+    daily_task = _Route(DailyTask)
+    check = _Route(Check)
+    load = _Route(Load)
+    home = _Route(Home)
+    clan = _Route(Clan)
+    clan_battle = _Route(ClanBattle)
+    profile = _Route(Profile)
+    payment = _Route(Payment)
+    equipment = _Route(Equipment)
+    tutorial = _Route(Tutorial)
+    quest = _Route(Quest)
+    shop = _Route(Shop)
+    mission = _Route(Mission)
+    room = _Route(Room)
+    event = _Route(Event)
+    story = _Route(Story)
+    present = _Route(Present)
+    account = _Route(Account)
+    tool = _Route(Tool)
+    chara_fortune = _Route(CharaFortune)
+
+
+def _compile(cls, prefix: str):
+    for r in vars(cls).values():
+        if not isinstance(r, _Route):
+            continue
+        r.cls.api = f'{prefix}/{r.cls.name}'
+        for name, ep in vars(r.cls).items():
+            if hasattr(ep, 'build'):
+                ep.api = f'{r.cls.api}/{name}'
+                ROUTES[ep.api] = ep.build
+        _compile(r.cls, r.cls.api)
+
+
+_compile(ReqDispatcher, '')
@@ -0,0 +1,91 @@
+import random
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, Optional
+
+import aiohttp
+import requests
+
+from .exception import PCRAPIException, PCRHTTPException
+from .ratelimit import TRANSPORT_ERRORS
+from .req import IDEMPOTENT_APIS
+
+# the request never left, retrying cannot apply it twice
+_NOT_SENT = (aiohttp.ClientConnectorError, requests.exceptions.ConnectTimeout) + \
+            ((aiohttp.ConnectionTimeoutError,) if hasattr(aiohttp, 'ConnectionTimeoutError') else ())
+
+# the request may have reached the server
+_TRANSIENT = TRANSPORT_ERRORS
+
+DEFAULT_RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+class RetryPolicy:
+    """which failures of PCRClient are tried again, after how long, and when reads are hedged
+
+    retryable failures:
+        connect errors, for every api: the request was not sent
+        timeouts, dropped connections and HTTP `retry_status`, for `safe_apis` only: a write may have been applied
+        PCRAPIException with a result_code in `retry_result_codes`, for every api: the server refused it as a whole
+    everything else is fatal and raised at once. attempt n (from 0) waits a random time in
+    [0, min(backoff_max, backoff_base * 2 ** n)] before the next one, at most `attempts` in total.
+
+    with `hedge`, a read of `safe_apis` that has not answered after the `hedge_quantile` of its latest
+    `window` latencies (once `hedge_min_samples` are known) is sent a second time, the first answer wins.
+    one RetryPolicy can be shared by many clients, the latencies are then learned from all of them
+    """
+
+    def __init__(self,
+                 attempts: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 10,
+                 retry_status: Iterable[int] = DEFAULT_RETRY_STATUS,
+                 retry_result_codes: Iterable[int] = (),
+                 safe_apis: Iterable[str] = IDEMPOTENT_APIS,
+                 hedge: bool = False,
+                 hedge_quantile: float = 0.95,
+                 hedge_min_delay: float = 0.05,
+                 hedge_min_samples: int = 20,
+                 window: int = 200):
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_status = frozenset(retry_status)
+        self.retry_result_codes = frozenset(retry_result_codes)
+        self.safe_apis = frozenset(safe_apis)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.retries = 0
+        self.hedges = 0
+
+    def retryable(self, api: str, e: BaseException) -> bool:
+        if isinstance(e, PCRAPIException):
+            return e.result_code in self.retry_result_codes
+        if isinstance(e, _NOT_SENT):
+            return True
+        if api not in self.safe_apis:
+            return False
+        if isinstance(e, PCRHTTPException):
+            return e.status in self.retry_status
+        return isinstance(e, _TRANSIENT)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def observe(self, api: str, seconds: float):
+        """latency of a successful request, from sent to decoded"""
+        if self.hedge and api in self.safe_apis:
+            self.latencies[api].append(seconds)
+
+    def hedge_delay(self, api: str) -> Optional[float]:
+        """seconds to wait before hedging, None not to hedge"""
+        if not self.hedge or api not in self.safe_apis:
+            return None
+        samples = self.latencies.get(api)
+        if samples is None or len(samples) < self.hedge_min_samples:
+            return None
+        v = sorted(samples)
+        return max(self.hedge_min_delay, v[min(len(v) - 1, int(self.hedge_quantile * len(v)))])
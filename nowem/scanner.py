@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Tuple, Union
+
+from .client import PCRClient
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class ProfileScanner:
+    """look up many players by profile/get_profile, spread over logged-in clients
+
+    every client runs `concurrency` workers, each request still goes through the client's limiter.
+    results are yielded in completion order, failed ids are kept in `failures` and can be scanned again by retry()
+    """
+
+    def __init__(self, clients: Iterable[PCRClient], concurrency: int = 2):
+        self.clients = list(clients)
+        if not self.clients:
+            raise ValueError('no client to scan with')
+        self.concurrency = concurrency
+        self.failures: Dict[int, Exception] = {}
+
+    async def scan(self, ids: Union[Iterable[int], AsyncIterable[int]]) -> AsyncIterator[Tuple[int, dict]]:
+        """yield (viewer_id, profile) for every id that succeeded"""
+        workers = len(self.clients) * self.concurrency
+        todo = asyncio.Queue(workers * 2)
+        done = asyncio.Queue()
+
+        async def feed():
+            try:
+                if isinstance(ids, AsyncIterable):
+                    async for i in ids:
+                        await todo.put(i)
+                else:
+                    for i in ids:
+                        await todo.put(i)
+            finally:
+                for _ in range(workers):
+                    await todo.put(_DONE)
+
+        async def work(c: PCRClient):
+            while True:
+                uid = await todo.get()
+                if uid is _DONE:
+                    break
+                try:
+                    await done.put((uid, await c.call_raw('/profile/get_profile', {'target_viewer_id': uid})))
+                except Exception as e:
+                    log.warning(f'get_profile({uid}) failed: {e!r}')
+                    self.failures[uid] = e
+            await done.put(_DONE)
+
+        tasks = [asyncio.ensure_future(feed())]
+        tasks += [asyncio.ensure_future(work(c)) for c in self.clients for _ in range(self.concurrency)]
+        try:
+            running = workers
+            while running:
+                r = await done.get()
+                if r is _DONE:
+                    running -= 1
+                    continue
+                self.failures.pop(r[0], None)
+                yield r
+            await tasks[0]
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    def retry(self) -> AsyncIterator[Tuple[int, dict]]:
+        """scan the failed ids again"""
+        return self.scan(list(self.failures))
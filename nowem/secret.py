@@ -1,8 +1,12 @@
 import base64
+import binascii
 import hashlib
 import logging
+import os
 import random
+import re
 import string
+import time
 from typing import Tuple
 
 import msgpack
@@ -13,6 +17,9 @@ from .exception import PCRAPIException
 
 _SALT_MD5 = 'r!I@nt8e5i='
 
+# how many encrypted viewer_id are prepared per account, one of them is picked for each request
+_VIEWER_ID_POOL_SIZE = 16
+
 _DEFAULT_HEADERS = {
     # client
     'Accept-Encoding': 'gzip',
@@ -55,10 +62,16 @@ class PCRSecret:
         self.short_udid = short_udid
         self.viewer_id = viewer_id
 
+        # per-account constants of signing
+        self._udid_iv = self.udid.replace('-', '')[:16].encode('utf8')
+        self._udid_sha1 = hashlib.sha1(self.udid.encode())
+
+        # per-client template, copied for every request and only updated by what the server tells
         self.headers = _DEFAULT_HEADERS.copy()
         if version:
             self.headers['APP-VER'] = version
         self.headers['SID'] = self.md5(self.viewer_id + self.udid)
+        self.headers['SHORT-UDID'] = self.enc_short_udid(self.short_udid)
 
     @staticmethod
     def md5(s: str) -> str:
@@ -70,15 +83,24 @@ class PCRSecret:
 
     @staticmethod
     def _random_key() -> bytes:
-        return PCRSecret.random_key or bytes(random.choices(b'0123456789abcdef', k=32))
+        return PCRSecret.random_key or os.urandom(16).hex().encode()
 
     @staticmethod
     def _viewer_key() -> bytes:
-        return PCRSecret.viewer_key or bytes(random.choices(b'0123456789abcdef', k=32))
+        return PCRSecret.viewer_key or os.urandom(16).hex().encode()
 
     @property
-    def _udid_iv(self) -> bytes:
-        return self.udid.replace('-', '')[:16].encode('utf8')
+    def viewer_id(self) -> str:
+        return self._viewer_id
+
+    @viewer_id.setter
+    def viewer_id(self, v: str):
+        # handle_resp() sets it from every response, the pool is only rebuilt when it really changes
+        if v == getattr(self, '_viewer_id', None):
+            return
+        self._viewer_id = v
+        self._viewer_id_bytes = v.encode()
+        self._viewer_id_pool = []
 
     @staticmethod
     def enc_short_udid(su: str) -> str:
@@ -91,10 +113,18 @@ class PCRSecret:
     def enc_viewer_id(self, key: bytes) -> str:
         return base64.b64encode(self.encrypt(self.viewer_id, key)).decode()
 
+    def _viewer_id_param(self) -> str:
+        if PCRSecret.viewer_key:
+            return self.enc_viewer_id(PCRSecret.viewer_key)
+        if not self._viewer_id_pool:
+            self._viewer_id_pool = [self.enc_viewer_id(self._viewer_key()) for _ in range(_VIEWER_ID_POOL_SIZE)]
+        return random.choice(self._viewer_id_pool)
+
     def param_sha1(self, api, packed) -> str:
-        param_sha1 = hashlib.sha1((self.udid + api).encode())
+        param_sha1 = self._udid_sha1.copy()
+        param_sha1.update(api.encode())
         param_sha1.update(base64.b64encode(packed))
-        param_sha1.update(self.viewer_id.encode())
+        param_sha1.update(self._viewer_id_bytes)
         return param_sha1.hexdigest()
 
     def encrypt(self, s: str, key: bytes) -> bytes:
@@ -112,42 +142,73 @@ class PCRSecret:
         return packed, aes.encrypt(Padding.pad(packed, 16)) + key
 
     def unpack(self, data: bytes) -> Tuple[dict, bytes]:
-        data = base64.b64decode(data.decode('utf8'))
-        aes = AES.new(data[-32:], AES.MODE_CBC, self._udid_iv)
-        dec = Padding.unpad(aes.decrypt(data[:-32]), 16)
-        return msgpack.unpackb(dec, strict_map_key=False), data[-32:]
+        d = BodyDecoder(len(data))
+        d.feed(data)
+        return self.unpack_buffer(d.finish())
 
-    def prepare_req(self, api: str, params: dict) -> Tuple[bytes, dict]:
-        key = PCRSecret._random_key()
-        log.debug(f'generated key={key}')
+    def unpack_buffer(self, buf: memoryview) -> Tuple[dict, bytes]:
+        """decrypt a base64-decoded response in place and unpack it without copying the payload"""
+        return unpack_buffer(self._udid_iv, buf)
 
-        if 'SHORT-UDID' not in self.headers:
-            self.headers['SHORT-UDID'] = self.enc_short_udid(self.short_udid)
-        if 'SID' not in self.headers:
-            self.headers['SID'] = self.md5(self.viewer_id + self.udid)
+    def prepare_req(self, api: str, params: dict, span=None) -> Tuple[bytes, dict]:
+        """build the body and a fresh headers dict for a request
 
+        neither the header template nor `params` is modified, so requests of one client can be in flight together
+        """
+        key = PCRSecret._random_key()
+        params = {**params, 'viewer_id': self._viewer_id_param()}
+
+        if span is None:
+            packed, crypted = self.pack(params, key)
+        else:
+            t = time.perf_counter()
+            packed = msgpack.packb(params, use_bin_type=False)
+            t1 = time.perf_counter()
+            crypted = AES.new(key, AES.MODE_CBC, self._udid_iv).encrypt(Padding.pad(packed, 16)) + key
+            span.add('pack', t1 - t)
+            span.add('encrypt', time.perf_counter() - t1)
+            span.request_bytes = len(crypted)
+
+        headers = self.headers.copy()
         if self.short_udid == '0' and self.viewer_id == '0':
-            self.headers['UDID'] = self.enc_short_udid(self.udid)
-        elif 'UDID' in self.headers:
-            del self.headers['UDID']
-
-        params['viewer_id'] = self.enc_viewer_id(PCRSecret._viewer_key())
-
-        packed, crypted = self.pack(params, key)
-
-        self.headers['PARAM'] = self.param_sha1(api, packed)
-        self.headers['Content-Length'] = str(len(crypted))
-
-        log.debug(f'headers = {self.headers}')
-        log.debug(f'params = {params}')
-        log.debug(f'crypted = {base64.b64encode(crypted).decode()}')
-
-        return crypted, self.headers
-
-    async def handle_resp(self, resp, no_headers=True) -> dict:
-        response, key = self.unpack(await resp.content)
-        log.debug(f'raw_response = {response}')
-        log.debug(f'key = {key}')
+            headers['UDID'] = self.enc_short_udid(self.udid)
+        headers['PARAM'] = self.param_sha1(api, packed)
+        headers['Content-Length'] = str(len(crypted))
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f'generated key={key}')
+            log.debug(f'headers = {headers}')
+            log.debug(f'params = {params}')
+            log.debug(f'crypted = {base64.b64encode(crypted).decode()}')
+
+        return crypted, headers
+
+    async def handle_resp(self, resp, no_headers=True, codec=None, span=None) -> dict:
+        t = time.perf_counter() if span is not None else 0.
+        d = BodyDecoder(int(resp.headers.get('Content-Length') or 0))
+        async for chunk in resp.iter_chunks():
+            d.feed(chunk)
+        buf = d.finish()
+
+        if span is None:
+            response, key = self.unpack_buffer(buf) if codec is None else await codec.unpack(self._udid_iv, buf)
+        else:
+            t1 = time.perf_counter()
+            span.add('download', t1 - t)
+            span.response_bytes = len(buf)
+            if codec is None:
+                body, key = decrypt_buffer(self._udid_iv, buf)
+                t2 = time.perf_counter()
+                response = msgpack.unpackb(body, strict_map_key=False)
+                span.add('decrypt', t2 - t1)
+                span.add('unpack', time.perf_counter() - t2)
+            else:
+                response, key = await codec.unpack(self._udid_iv, buf)
+                span.add('decode', time.perf_counter() - t1)
+            span.result_code = response['data_headers'].get('result_code')
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f'raw_response = {response}')
+            log.debug(f'key = {key}')
 
         headers = response['data_headers']
         body = response['data']
@@ -165,3 +226,65 @@ class PCRSecret:
             self.headers['RES-VER'] = headers['required_res_ver']
 
         return body if no_headers else response
+
+
+def decrypt_buffer(iv: bytes, buf) -> Tuple[memoryview, bytes]:
+    """decrypt a base64-decoded response in place, return the unpadded plaintext and the key. `buf` must be writable"""
+    if not isinstance(buf, memoryview):
+        buf = memoryview(buf)
+    key = bytes(buf[-32:])
+    body = buf[:-32]
+    AES.new(key, AES.MODE_CBC, iv).decrypt(body, output=body)
+    pad = body[-1]
+    if not 0 < pad <= 16 or len(body) % 16 or body[-pad:] != bytes((pad,)) * pad:
+        raise ValueError('Padding is incorrect.')
+    return body[:-pad], key
+
+
+def unpack_buffer(iv: bytes, buf) -> Tuple[dict, bytes]:
+    """module level so that it can be sent to a process pool, `buf` must be writable"""
+    body, key = decrypt_buffer(iv, buf)
+    return msgpack.unpackb(body, strict_map_key=False), key
+
+
+def pack_response(iv: bytes, obj: dict, key: bytes = None) -> bytes:
+    """encode a response the way the server does, for local stand-ins of it"""
+    key = key or os.urandom(16).hex().encode()
+    aes = AES.new(key, AES.MODE_CBC, iv)
+    return base64.b64encode(aes.encrypt(Padding.pad(msgpack.packb(obj, use_bin_type=False), 16)) + key)
+
+
+_WHITESPACE = b' \t\r\n\v\f'
+_has_whitespace = re.compile(rb'[ \t\r\n\v\f]').search
+
+
+class BodyDecoder:
+    """base64-decode a response body into one preallocated buffer while it streams in
+
+    the AES key sits at the end of the body, so decryption can only start when all the data arrived,
+    but the base64 text never has to be held as a whole
+    """
+
+    def __init__(self, size_hint: int = 0):
+        self.buf = bytearray(size_hint * 3 // 4)
+        self.pos = 0
+        self.tail = b''
+
+    def feed(self, chunk: bytes):
+        # like base64.b64decode, line breaks and spaces (e.g. of captured or wrapped bodies) are skipped
+        if _has_whitespace(chunk):
+            chunk = bytes(chunk).translate(None, _WHITESPACE)
+        if self.tail:
+            chunk = self.tail + chunk
+        n = len(chunk) - len(chunk) % 4
+        self.tail = chunk[n:]
+        if not n:
+            return
+        dec = binascii.a2b_base64(memoryview(chunk)[:n])
+        self.buf[self.pos:self.pos + len(dec)] = dec
+        self.pos += len(dec)
+
+    def finish(self) -> memoryview:
+        if self.tail:
+            raise ValueError('truncated base64 body')
+        return memoryview(self.buf)[:self.pos]
@@ -0,0 +1,55 @@
+import json
+import os
+import time
+from typing import Iterable, Optional
+
+from . import client
+from .state import GameState
+
+_SNAPSHOT_VERSION = 1
+
+# headers the server teaches the client through handle_resp()
+_LEARNED_HEADERS = ('RES-VER',)
+
+# parts of load/index kept in a snapshot
+DEFAULT_GAME_DATA_KEYS = ('user_info', 'user_jewel', 'user_gold', 'item_list', 'clan_like_count')
+
+
+def snapshot(c: 'client.PCRClient', game_data_keys: Iterable[str] = DEFAULT_GAME_DATA_KEYS) -> dict:
+    """the state a logged-in client needs to skip login, small enough to be stored per account"""
+    return {
+        'v': _SNAPSHOT_VERSION,
+        'time': time.time(),
+        'viewer_id': c.sec.viewer_id,
+        'token': c.token,
+        'headers': {k: c.sec.headers[k] for k in _LEARNED_HEADERS if k in c.sec.headers},
+        'game_data': {k: c.game_data[k] for k in game_data_keys if k in (c.game_data or {})},
+    }
+
+
+def restore(c: 'client.PCRClient', snap: dict):
+    c.sec.viewer_id = snap['viewer_id']
+    c.sec.headers.update(snap['headers'])
+    c.token = snap['token']
+    c.game_data = GameState(snap['game_data'], snap['time'])
+
+
+def save(c: 'client.PCRClient', path: str, game_data_keys: Iterable[str] = DEFAULT_GAME_DATA_KEYS):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(c, game_data_keys), f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def load(path: str, max_age: float = 86400) -> Optional[dict]:
+    """read a snapshot, None when there is none or it is too old to be worth trying"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snap = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return snap if is_fresh(snap, max_age) else None
+
+
+def is_fresh(snap: dict, max_age: float = 86400) -> bool:
+    return snap.get('v') == _SNAPSHOT_VERSION and time.time() - snap['time'] <= max_age
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable
+
+from .cache import params_key
+from .req import ACCOUNT_FREE_APIS, IDEMPOTENT_APIS
+
+
+class SingleFlight:
+    """let concurrent identical calls share one round-trip and one decode
+
+    only apis in `apis` are coalesced. calls are identical when api and params are equal, and the account too unless
+    `across_accounts` is set, which lets clients sharing this object (e.g. in a ClientPool) share answers of
+    account-independent reads; `apis` then defaults to, and must stay within, ACCOUNT_FREE_APIS (profile/get_profile),
+    and `data_headers` come from whichever account asked first. the shared response must not be modified by callers
+    """
+
+    def __init__(self, apis: Iterable[str] = None, across_accounts: bool = False):
+        if apis is None:
+            apis = ACCOUNT_FREE_APIS if across_accounts else IDEMPOTENT_APIS
+        self.apis = frozenset(apis)
+        if across_accounts and not self.apis <= ACCOUNT_FREE_APIS:
+            raise ValueError(f'apis depending on the account cannot be shared across accounts: '
+                             f'{sorted(self.apis - ACCOUNT_FREE_APIS)}')
+        self.across_accounts = across_accounts
+        self.shared = 0
+        self._flights: Dict[tuple, asyncio.Future] = {}
+
+    def key(self, viewer_id: str, api: str, params: dict) -> tuple:
+        return ('' if self.across_accounts else viewer_id), api, params_key(params)
+
+    async def do(self, key: tuple, fn: Callable[[], Awaitable[dict]]) -> dict:
+        f = self._flights.get(key)
+        if f is None:
+            f = self._flights[key] = asyncio.ensure_future(fn())
+            f.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.shared += 1
+        # a cancelled caller must not cancel the flight of the others
+        return await asyncio.shield(f)
@@ -0,0 +1,79 @@
+import time
+from typing import Any, Dict
+
+# keys holding one record, merged field by field
+_RECORD_KEYS = ('user_info', 'user_jewel', 'user_gold')
+
+# keys holding lists of records, merged by the id field given here
+_LIST_KEYS = {
+    'item_list': 'id',
+    'material_list': 'id',
+    'user_equip': 'id',
+    'unit_list': 'id',
+}
+
+
+class GameState(dict):
+    """game_data of load/index, kept up to date by the deltas other apis send back
+
+    quest, shop, present, mission... responses carry the new values of what they changed under the same keys as
+    load/index (user_jewel, user_gold, item_list...), PCRClient merges the answers of req.STATE_APIS by apply().
+    `updated` tells when a key was last refreshed, so stale values can be spotted without calling load/index again
+    """
+
+    def __init__(self, data: dict = None, updated: float = None):
+        super().__init__(data or {})
+        # apply() changes these in place, they must not be the dicts and lists of a (cached or shared) response
+        for k in _RECORD_KEYS:
+            if isinstance(self.get(k), dict):
+                self[k] = dict(self[k])
+        for k in _LIST_KEYS:
+            if isinstance(self.get(k), list):
+                self[k] = list(self[k])
+        t = time.time() if updated is None else updated
+        self.updated: Dict[str, float] = {k: t for k in self}
+
+    def apply(self, body: dict):
+        if not isinstance(body, dict):
+            return
+        now = time.time()
+        for k in _RECORD_KEYS:
+            v = body.get(k)
+            if isinstance(v, dict):
+                if isinstance(self.get(k), dict):
+                    self[k].update(v)
+                else:
+                    self[k] = dict(v)
+                self.updated[k] = now
+        for k, id_key in _LIST_KEYS.items():
+            v = body.get(k)
+            if not isinstance(v, list) or not v:
+                continue
+            old = self.setdefault(k, [])
+            index = {e[id_key]: i for i, e in enumerate(old) if id_key in e}
+            for e in v:
+                i = index.get(e.get(id_key))
+                if i is None:
+                    index[e.get(id_key)] = len(old)
+                    old.append(e)
+                else:
+                    old[i] = {**old[i], **e}
+            self.updated[k] = now
+
+    def field(self, *path, default: Any = None) -> Any:
+        """e.g. field('user_jewel', 'free_jewel')"""
+        v = self
+        for p in path:
+            try:
+                v = v[p]
+            except (KeyError, IndexError, TypeError):
+                return default
+        return v
+
+    def age(self, key: str) -> float:
+        """seconds since key was refreshed, inf if never"""
+        t = self.updated.get(key)
+        return float('inf') if t is None else time.time() - t
+
+    def is_stale(self, key: str, max_age: float) -> bool:
+        return self.age(key) > max_age
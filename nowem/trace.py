@@ -0,0 +1,101 @@
+import time
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+# phases of one request, in order
+PHASES = ('queue', 'pack', 'encrypt', 'connect', 'ttfb', 'download', 'decrypt', 'unpack', 'decode', 'sleep')
+
+
+class Span:
+    """timings of one request, filled along PCRClient._send()
+
+    phases are in seconds: queue (rate limiter wait), pack (msgpack), encrypt (AES), connect, ttfb (request sent to
+    response headers, without connect), download (body + base64), decrypt, unpack (msgpack), decode (decrypt + unpack
+    when done by a CodecExecutor). `decode` replaces decrypt and unpack, `sleep` is reported apart by end_point
+    """
+    __slots__ = ('api', 'start', 'phases', 'request_bytes', 'response_bytes', 'result_code', 'error')
+
+    def __init__(self, api: str):
+        self.api = api
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.result_code: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.) + seconds
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+
+class Tracer:
+    """hooks of PCRClient, the base class records nothing
+
+    a client without a tracer (the default) does not even build spans
+    """
+
+    def start(self, api: str) -> Span:
+        return Span(api)
+
+    def finish(self, span: Span):
+        pass
+
+    def record(self, api: str, phase: str, seconds: float):
+        """a timing outside of a request, e.g. the sleep of end_point"""
+        pass
+
+
+class MultiTracer(Tracer):
+    def __init__(self, tracers: Iterable[Tracer]):
+        self.tracers = list(tracers)
+
+    def start(self, api: str) -> Span:
+        # every tracer sees the start, they all get the first span at finish()
+        spans = [t.start(api) for t in self.tracers]
+        return spans[0] if spans else Span(api)
+
+    def finish(self, span: Span):
+        for t in self.tracers:
+            t.finish(span)
+
+    def record(self, api: str, phase: str, seconds: float):
+        for t in self.tracers:
+            t.record(api, phase, seconds)
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class MemoryTracer(Tracer):
+    """keeps the last `maxlen` samples per api and phase, summary() gives p50/p95/p99"""
+
+    def __init__(self, maxlen: int = 1000):
+        self.maxlen = maxlen
+        self.samples: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=self.maxlen))
+        self.bytes: Dict[str, Counter] = defaultdict(Counter)
+        self.result_codes: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, api: str, phase: str, seconds: float):
+        self.samples[api, phase].append(seconds)
+
+    def finish(self, span: Span):
+        for phase, seconds in span.phases.items():
+            self.record(span.api, phase, seconds)
+        self.record(span.api, 'total', span.total)
+        self.bytes[span.api]['out'] += span.request_bytes
+        self.bytes[span.api]['in'] += span.response_bytes
+        self.result_codes[span.api][type(span.error).__name__ if span.error else span.result_code] += 1
+
+    def summary(self) -> Dict[str, Dict[str, dict]]:
+        """{api: {phase: {count, p50, p95, p99}}}, in seconds"""
+        res = defaultdict(dict)
+        for (api, phase), values in self.samples.items():
+            v = sorted(values)
+            res[api][phase] = {'count': len(v), 'p50': _percentile(v, .5), 'p95': _percentile(v, .95),
+                               'p99': _percentile(v, .99)}
+        return dict(res)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from . import aiorequests
+
+
+class Transport:
+    """send http requests for PCRClient
+
+    a transport returns response objects which provide `status_code`, `headers`, an awaitable `content`
+    and `iter_chunks()` that streams the body. `span` (a trace.Span) gets the connect time when it is known
+    """
+
+    async def request(self, method: str, url: str, span=None, **kwargs):
+        raise NotImplementedError
+
+    async def get(self, url: str, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, data=None, **kwargs):
+        return await self.request('POST', url, data=data, **kwargs)
+
+    async def close(self):
+        pass
+
+
+class ExecutorTransport(Transport):
+    """the legacy path: blocking `requests` calls wrapped in the default executor"""
+
+    async def request(self, method: str, url: str, span=None, **kwargs):
+        return await aiorequests.request(method, url, **kwargs)
+
+
+class AiohttpResponse:
+    def __init__(self, response: aiohttp.ClientResponse):
+        self.raw_response = response
+
+    @property
+    def ok(self) -> bool:
+        return self.raw_response.ok
+
+    @property
+    def status_code(self) -> int:
+        return self.raw_response.status
+
+    @property
+    def headers(self):
+        return self.raw_response.headers
+
+    @property
+    def url(self):
+        return str(self.raw_response.url)
+
+    def __repr__(self):
+        return '<AiohttpResponse [%s]>' % self.raw_response.status
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    async def content(self) -> bytes:
+        try:
+            return await self.raw_response.read()
+        finally:
+            self.raw_response.release()
+
+    @property
+    async def text(self) -> str:
+        try:
+            return await self.raw_response.text()
+        finally:
+            self.raw_response.release()
+
+    async def iter_chunks(self, size: int = 65536) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self.raw_response.content.iter_chunked(size):
+                yield chunk
+        finally:
+            self.raw_response.release()
+
+
+def _span_trace_config() -> aiohttp.TraceConfig:
+    async def on_start(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.connect_start = time.perf_counter()
+
+    async def on_end(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx.add('connect', time.perf_counter() - ctx.connect_start)
+
+    tc = aiohttp.TraceConfig()
+    tc.on_connection_create_start.append(on_start)
+    tc.on_connection_create_end.append(on_end)
+    return tc
+
+
+class AiohttpTransport(Transport):
+    """native asyncio transport, keeps one pooled keep-alive session per api root
+
+    the transport can be shared among clients, sessions are created lazily inside the running loop
+    """
+
+    def __init__(self, limit_per_host: int = 32, keepalive_timeout: float = 30):
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._lock = asyncio.Lock()
+
+    async def session(self, url: str) -> aiohttp.ClientSession:
+        u = urlsplit(url)
+        root = f'{u.scheme}://{u.netloc}'
+        s = self._sessions.get(root)
+        if s is None or s.closed:
+            async with self._lock:
+                s = self._sessions.get(root)
+                if s is None or s.closed:
+                    connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.limit_per_host,
+                                                     keepalive_timeout=self.keepalive_timeout)
+                    s = aiohttp.ClientSession(connector=connector, skip_auto_headers=('User-Agent',),
+                                              trace_configs=[_span_trace_config()])
+                    self._sessions[root] = s
+        return s
+
+    async def request(self, method: str, url: str, span=None, *, timeout: Optional[float] = None,
+                      proxies: dict = None, **kwargs) -> AiohttpResponse:
+        s = await self.session(url)
+        if span is not None:
+            kwargs['trace_request_ctx'] = span
+        if proxies:
+            kwargs.setdefault('proxy', proxies.get(urlsplit(url).scheme))
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        return AiohttpResponse(await s.request(method, url, **kwargs))
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for s in sessions.values():
+            await s.close()
@@ -13,7 +13,8 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/TWT233/nowem",
     packages=setuptools.find_packages(),
-    install_requires=['requests==2.25.1', 'msgpack>=1.0.1', 'pycryptodomex>=3.9.9'],
+    install_requires=['requests==2.25.1', 'aiohttp>=3.7.4', 'msgpack>=1.0.1', 'pycryptodomex>=3.9.9'],
+    extras_require={'numpy': ['numpy']},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",